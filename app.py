@@ -1,68 +1,150 @@
+import io
+import os
 import streamlit as st
+import numpy as np
 import pandas as pd
-import unicodedata
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
-
-# ---------------------- Helper Functions ----------------------
-
-def fix_name(name):
-    """Clean player name for proper display"""
-    try:
-        return unicodedata.normalize('NFKD', name).encode('latin1').decode('utf-8')
-    except:
-        return name
-
-def convert_value(val):
-    """Convert value strings like '€30m' into float (e.g. 30,000,000)"""
-    if isinstance(val, str):
-        val = val.replace('€', '').replace('m', 'e6').replace('M', 'e6').replace('k', 'e3').strip()
-        try:
-            return float(eval(val))
-        except:
-            return None
-    return val
+from market_model import ML_FEATURES, MODEL_PATH, fit_baseline, load_model, predict_file, predict_values, score_players, train_in_background
+from player_data import POSITION_GROUPS, dataset_fingerprint, load_players
+from player_history import HISTORY_PATH, ValueHistory
+from recommend import DEFAULT_WEIGHTS, SCORE_TERMS, NameSearchIndex, PlayerIndex, ScoringEngine, SimilarityIndex, optimize_squad
 
 # ---------------------- Load & Clean Data ----------------------
 
-@st.cache_data
-def load_data():
-    """Load player dataset and clean key fields"""
-    df = pd.read_excel("data/processed/transfermarkt_players.xlsx")
-
-    if 'Player' in df.columns:
-        df.rename(columns={'Player': 'PlayerName'}, inplace=True)
-
-    df['PlayerName'] = df['PlayerName'].apply(fix_name)
-    df['MarketValue'] = df['MarketValue'].apply(convert_value)
+@st.cache_resource(max_entries=1)
+def load_data(fingerprint):
+    """Load cleaned player dataset once per dataset version (from the columnar snapshot when available)
 
-    # Drop players missing critical fields
-    df.dropna(subset=['MarketValue', 'Position', 'Club'], inplace=True)
+    The frame is shared by every session and rerun, so it must never be modified in place.
+    """
+    return load_players()
 
-    return df
-
-df = load_data()
+# Checked on every rerun: when the scrapers rewrite the dataset, the frame, the derived
+# columns, the indexes and the model below are all rebuilt under the new fingerprint
+fingerprint = dataset_fingerprint()
+df = load_data(fingerprint)
 
 # ---------------------- Train ML Model ----------------------
 
 # Use historical player stats to predict market value
-ml_features = ['Age', 'Goals', 'Assists', 'MatchesPlayed', 'YellowCards', 'OwnGoals']
-ml_df = df[ml_features + ['MarketValue']].dropna()
-
-# Features (X) and Target (y)
-X = ml_df[ml_features]
-y = ml_df['MarketValue']
-
-# Train simple regression model
-model = LinearRegression()
-model.fit(X, y)
-
-# Prepare prediction data for entire dataset
-X_all = df[ml_features].fillna(0)  # Fill missing stats with 0 for prediction
-df['PredictedValue'] = model.predict(X_all)
-
-# Calculate difference between predicted and actual value
-df['ValueGap'] = df['PredictedValue'] - df['MarketValue']
+ml_features = ML_FEATURES
+
+@st.cache_resource
+def start_training(fingerprint, features, model_version, _df):
+    """Run cross-validated model selection once per dataset, off the request path
+
+    A manifest rewritten for other data (e.g. a slower run for the previous dataset)
+    changes `model_version`, so training starts again for the current one.
+    """
+    return train_in_background(_df, list(features), fingerprint)
+
+@st.cache_resource(max_entries=2)
+def get_model(fingerprint, features, model_version, _df):
+    """Load the trained model artifact (or fall back to fitting the linear baseline) once per dataset and model version"""
+    features = list(features)
+    loaded = load_model(fingerprint, features)
+    model, info = loaded if loaded else fit_baseline(_df, features)
+
+    # Predict the entire dataset and the gap to each player's actual value
+    players = score_players(_df, model, features)
+
+    return {"model": model, "info": info, "trained": loaded is not None, "players": players}
+
+@st.cache_resource(max_entries=2)
+def get_index(fingerprint, features, model_version, _players):
+    """Build the Recommend tab filter index once per dataset and model"""
+    return PlayerIndex(_players)
+
+@st.cache_resource(max_entries=2)
+def get_scoring_engine(fingerprint, features, model_version, _players):
+    """Standardize the AI ranking terms once per dataset and model, sliders only re-weight them"""
+    return ScoringEngine(_players)
+
+@st.cache_resource(max_entries=2)
+def get_similarity_index(fingerprint, features, _players):
+    """Build the similar-players search index once per dataset and feature list"""
+    return SimilarityIndex(_players, features)
+
+@st.cache_data(max_entries=4)
+def predict_upload(data, name, fingerprint, model_version, _model):
+    """Predict an uploaded sheet in chunks and return the CSV bytes and row count"""
+    output = io.StringIO()
+    count = predict_file(_model, io.BytesIO(data), output, ml_features, name=name)
+    return output.getvalue().encode("utf-8"), count
+
+# The manifest's mtime is part of the cache key, so a newly trained model is picked up on the next rerun
+model_version = os.path.getmtime(MODEL_PATH) if os.path.exists(MODEL_PATH) else None
+registry = get_model(fingerprint, tuple(ml_features), model_version, df)
+training_error = None
+if not registry["trained"]:
+    # A failed run stays cached: training restarts for new data or model, or from the retry button
+    training_error = start_training(fingerprint, tuple(ml_features), model_version, df).error
+model = registry["model"]
+df = registry["players"]
+player_index = get_index(fingerprint, tuple(ml_features), model_version, df)
+similarity_index = get_similarity_index(fingerprint, tuple(ml_features), df)
+scoring_engine = get_scoring_engine(fingerprint, tuple(ml_features), model_version, df)
+
+# Rows sent to the browser per "Load more" step of the recommendation table
+PAGE_SIZE = 50
+RECOMMEND_COLUMNS = ['PlayerName', 'Age', 'Position', 'Club', 'MarketValue', 'PredictedValue', 'Goals', 'Assists']
+WEIGHT_LABELS = {
+    'ValueGap': "Value gap", 'Age': "Age (peak around 26)", 'Goals': "Goals per match",
+    'Assists': "Assists per match", 'Discipline': "Discipline (fewer cards)",
+}
+COMPARE_STATS = ['Goals', 'Assists', 'MarketValue', 'PredictedValue', 'Age', 'MatchesPlayed']
+
+def highlight_max(s):
+    is_max = s == s.max()
+    return ['background-color: lightgreen' if v else '' for v in is_max]
+
+@st.cache_resource(max_entries=2)
+def get_identities(fingerprint, _df):
+    """First row and display label of every PlayerKey, indexed by key for O(1) lookups
+
+    Namesakes get their club and age in the label so they can be told apart.
+    """
+    first = ~_df['PlayerKey'].duplicated().to_numpy()
+    players = _df[first]
+    names = players['PlayerName'].astype(str)
+    details = ' (' + players['Club'].astype(str) + ', ' + players['Age'].astype(str) + ')'
+    labels = names.where(~names.duplicated(keep=False), names + details)
+    keys = pd.Index(players['PlayerKey'].astype(str))
+    return {
+        "rows": pd.Series(np.flatnonzero(first), index=keys),
+        "labels": pd.Series(labels.to_numpy(), index=keys),
+    }
+
+@st.cache_resource(max_entries=2)
+def get_name_index(fingerprint, _df):
+    """Typeahead index over the name of every player, most valuable first"""
+    rows = get_identities(fingerprint, _df)["rows"].to_numpy()
+    return NameSearchIndex(_df['SearchName'].to_numpy()[rows], _df['MarketValue'].to_numpy()[rows])
+
+@st.cache_data(max_entries=32)
+def get_comparison(selected, fingerprint, model_version, _players):
+    """Comparison table, built once per selection set, dataset and model (styled per render, a Styler is mutable)"""
+    labels = get_identities(fingerprint, _players)["labels"]
+    compare_df = _players[_players['PlayerKey'].isin(selected)]
+    return compare_df[COMPARE_STATS].set_axis(labels[compare_df['PlayerKey'].astype(str)].to_numpy())
+
+@st.cache_data(max_entries=32)
+def get_squad(fingerprint, model_version, budget, quotas, objective, excluded_clubs, _df):
+    """Optimal squad's row positions, solved once per dataset, model and squad settings"""
+    return optimize_squad(_df, budget, dict(quotas), objective=objective, excluded_clubs=list(excluded_clubs))
+
+@st.cache_data(max_entries=32)
+def value_history(keys, last, history_version, fingerprint, _df):
+    """Market value history and deltas of the given players, queried from the snapshot store
+
+    Also returns the store's canonical key of each requested key. Keys the store has
+    never seen are matched to scraped players by name and club.
+    """
+    store = ValueHistory(HISTORY_PATH)
+    try:
+        canonical = store.lookup(keys, _df)
+        return store.history(canonical, last), store.value_deltas(last, canonical), canonical
+    finally:
+        store.close()
 
 # ---------------------- UI: App Layout ----------------------
 
@@ -80,55 +162,137 @@ with tab1:
     budget = st.number_input("Enter your total budget (€)", min_value=0.0, value=50_000_000.0)
 
     # Filters
-    positions = st.multiselect("Preferred Positions", options=df['Position'].unique(), default=list(df['Position'].unique()))
-    excluded_clubs = st.multiselect("Exclude Clubs", options=df['Club'].unique())
+    positions = st.multiselect("Preferred Positions", options=player_index.positions, default=list(player_index.positions))
+    excluded_clubs = st.multiselect("Exclude Clubs", options=player_index.clubs)
 
     # Toggle AI Recommendation
     use_ai = st.checkbox("💡 Use AI to Recommend Undervalued Players")
 
-    # Filter by user inputs
-    filtered_df = df.copy()
-    filtered_df = filtered_df[filtered_df['MarketValue'] <= budget]
-
-    if positions:
-        filtered_df = filtered_df[filtered_df['Position'].isin(positions)]
-    if excluded_clubs:
-        filtered_df = filtered_df[~filtered_df['Club'].isin(excluded_clubs)]
-
-    # If AI mode: Recommend undervalued players
+    # If AI mode: Recommend undervalued players, ranked by a weighted score
+    weights = {}
     if use_ai:
-        filtered_df = filtered_df[filtered_df['ValueGap'] > 0]  # Players who are predicted to be worth more
         st.info("AI recommending players whose predicted value is higher than actual value. These might be great value picks!")
-
-    # Display result
-    st.subheader(f"✅ {len(filtered_df)} Players Found")
-    if not filtered_df.empty:
-        st.dataframe(
-            filtered_df.sort_values(by="ValueGap" if use_ai else "MarketValue", ascending=False)[[
-                'PlayerName', 'Age', 'Position', 'Club', 'MarketValue', 'PredictedValue', 'Goals', 'Assists'
-            ]].reset_index(drop=True),
-            use_container_width=True
-        )
+        with st.expander("⚖️ Ranking weights"):
+            st.caption("Goals, assists and discipline count more or less depending on each player's position.")
+            weight_cols = st.columns(len(SCORE_TERMS))
+            weights = {
+                term: weight_cols[i].slider(WEIGHT_LABELS[term], 0.0, 2.0, DEFAULT_WEIGHTS[term], 0.1, key=f"weight_{term}")
+                for i, term in enumerate(SCORE_TERMS)
+            }
+
+    # Display result: only the first pages are sent to the browser, a new filter starts over
+    query = (fingerprint, model_version, budget, tuple(positions), tuple(excluded_clubs), use_ai, tuple(weights.items()))
+    if st.session_state.get("recommend_query") != query:
+        st.session_state["recommend_query"] = query
+        st.session_state["recommend_shown"] = PAGE_SIZE
+
+    # Filter by user inputs (row positions from the precomputed index, no copy of the table)
+    if use_ai:
+        # Players who are predicted to be worth more, only the shown top K are ranked
+        mask = player_index.mask(budget, positions=positions, excluded_clubs=excluded_clubs, undervalued=True)
+        total = int(mask.sum())
+        rows, scores = scoring_engine.top(weights, st.session_state["recommend_shown"], mask)
+    else:
+        rows = player_index.filter(budget, positions=positions, excluded_clubs=excluded_clubs, order="MarketValue")
+        total = len(rows)
+    shown = min(st.session_state["recommend_shown"], total)
+
+    st.subheader(f"✅ {total} Players Found")
+    if total:
+        table = df.iloc[rows[:shown]][RECOMMEND_COLUMNS].reset_index(drop=True)
+        if use_ai:
+            table.insert(0, 'Score', scores[:shown].round(2))
+        st.dataframe(table, use_container_width=True)
+        if shown < total:
+            def show_more():
+                st.session_state["recommend_shown"] += PAGE_SIZE
+
+            st.caption(f"Showing the top {shown:,} of {total:,} players")
+            st.button(f"Load {min(PAGE_SIZE, total - shown)} more", on_click=show_more)
     else:
         st.warning("No players match your criteria.")
 
+    # Squad builder: best combination of players whose fees add up to the total budget
+    with st.expander("🧩 Build the best squad within your total budget"):
+        objective = st.radio(
+            "Maximise", ["ValueGap", "PredictedValue"], horizontal=True,
+            format_func=lambda o: "Value gap (undervalued)" if o == "ValueGap" else "Predicted value",
+        )
+        st.caption("How many players do you need per position?")
+        quota_cols = st.columns(3)
+        quotas = {
+            pos: quota_cols[i % 3].number_input(pos, min_value=0, max_value=5, value=0, key=f"quota_{pos}")
+            for i, pos in enumerate(positions)
+        }
+
+        if sum(quotas.values()) == 0:
+            st.info("Set at least one position quota to build a squad.")
+        else:
+            squad = get_squad(
+                fingerprint, model_version, budget, tuple(quotas.items()), objective, tuple(excluded_clubs), df
+            )
+            if len(squad):
+                squad_df = df.iloc[squad][['PlayerName', 'Age', 'Position', 'Club', 'MarketValue', 'PredictedValue', 'ValueGap']]
+                st.dataframe(squad_df.reset_index(drop=True), use_container_width=True)
+                st.success(
+                    f"Squad cost: **€{squad_df['MarketValue'].sum():,.0f}** of €{budget:,.0f} "
+                    f"— total value gap €{squad_df['ValueGap'].sum():,.0f}"
+                )
+            else:
+                st.warning("No squad with these quotas fits the budget.")
+
 # ---------------------- Tab 2: Compare ----------------------
 
 with tab2:
     st.header("📊 Compare Player Stats")
 
-    selected_players = st.multiselect("Select players to compare", df['PlayerName'].unique())
+    identities = get_identities(fingerprint, df)
+    player_label = identities["labels"].__getitem__
 
-    def highlight_max(s):
-        is_max = s == s.max()
-        return ['background-color: lightgreen' if v else '' for v in is_max]
+    # Search server-side and only send the matches (plus the current selection) to the browser
+    query = st.text_input("🔍 Search players", placeholder="Type a name, e.g. mbappe")
+    matches = identities["labels"].index[get_name_index(fingerprint, df).search(query, limit=20)]
+    options = list(dict.fromkeys([*st.session_state.get("compare_players", []), *matches]))
+    selected_players = st.multiselect(
+        "Select players to compare", options, format_func=player_label, key="compare_players"
+    )
 
     if selected_players:
-        compare_df = df[df['PlayerName'].isin(selected_players)]
-        stats_to_compare = ['Goals', 'Assists', 'MarketValue', 'PredictedValue', 'Age', 'MatchesPlayed']
-        display_df = compare_df[['PlayerName'] + stats_to_compare].set_index('PlayerName')
-        styled_df = display_df.style.apply(highlight_max, axis=0)
-        st.dataframe(styled_df, use_container_width=True)
+        display_df = get_comparison(tuple(sorted(selected_players)), fingerprint, model_version, df)
+        st.dataframe(display_df.style.apply(highlight_max, axis=0), use_container_width=True)
+
+        # Similar players: nearest neighbours on standardized stats and position
+        st.subheader("🔎 Find Similar Players")
+        reference = st.selectbox("Players similar to", selected_players, format_func=player_label)
+        k = st.slider("Number of players", min_value=1, max_value=25, value=10)
+        only_undervalued = st.checkbox("Only undervalued players")
+        only_in_budget = st.checkbox(f"Only players within the budget (€{budget:,.0f})")
+
+        mask = np.ones(len(df), dtype=bool)
+        if only_undervalued:
+            mask &= df['ValueGap'].to_numpy() > 0
+        if only_in_budget:
+            mask &= df['MarketValue'].to_numpy() <= budget
+
+        reference_row = int(identities["rows"][reference])
+        similar_rows, distances = similarity_index.similar(reference_row, k=k, mask=mask)
+        similar_df = df.iloc[similar_rows][['PlayerName', 'Age', 'Position', 'Club', 'MarketValue', 'PredictedValue']]
+        st.dataframe(similar_df.assign(Distance=distances).reset_index(drop=True), use_container_width=True)
+
+        # Value trend across scrapes, only queried for the selected players
+        if os.path.exists(HISTORY_PATH):
+            st.subheader("📈 Market Value Trend")
+            last = st.slider("Snapshots to include", min_value=2, max_value=20, value=5)
+            keys = tuple(sorted(selected_players))
+            history, deltas, canonical = value_history(keys, last, os.path.getmtime(HISTORY_PATH), fingerprint, df)
+            label_of = {player_key: player_label(key) for key, player_key in zip(keys, canonical)}
+            if history['taken_on'].nunique() > 1:
+                trend = history.pivot_table(index='taken_on', columns='player_key', values='MarketValue')
+                st.line_chart(trend.rename(columns=label_of))
+                deltas = deltas.assign(PlayerName=deltas['player_key'].map(label_of)).drop(columns='player_key')
+                st.dataframe(deltas, use_container_width=True)
+            else:
+                st.caption("Not enough scrapes of these players yet to show a trend.")
     else:
         st.info("Select players from the dropdown to compare.")
 
@@ -144,9 +308,43 @@ with tab3:
     matches = st.number_input("Matches Played", min_value=0, value=30)
     yellow = st.number_input("Yellow Cards", min_value=0, value=2)
     own_goals = st.number_input("Own Goals", min_value=0, value=0)
+    group = st.selectbox(
+        "Position", [-1, *range(len(POSITION_GROUPS))],
+        format_func=lambda g: "Any position" if g < 0 else POSITION_GROUPS[g],
+    )
 
     # Predict on button click
     if st.button("Predict Market Value"):
-        input_data = [[age, goals, assists, matches, yellow, own_goals]]
-        predicted_value = model.predict(input_data)[0]
+        input_data = pd.DataFrame([[age, goals, assists, matches, yellow, own_goals]], columns=ml_features)
+        predicted_value = predict_values(model, input_data, [group])[0]
         st.success(f"Estimated Market Value: **€{predicted_value:,.2f}**")
+
+    # Batch mode: score a whole sheet of candidates at once
+    st.subheader("📂 Batch Prediction")
+    uploaded = st.file_uploader(
+        f"Upload a CSV or Excel sheet with the columns: {', '.join(ml_features)} (and optionally Position)", type=["csv", "xlsx"]
+    )
+    if uploaded is not None:
+        try:
+            predictions, count = predict_upload(uploaded.getvalue(), uploaded.name, fingerprint, model_version, model)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.success(f"Predicted market values for {count:,} players")
+            st.download_button(
+                "⬇️ Download predictions", predictions,
+                file_name=os.path.splitext(uploaded.name)[0] + "_predictions.csv", mime="text/csv",
+            )
+
+    info = registry["info"]
+    if info["cv"]:
+        best = info["cv"][info["model"]]
+        st.caption(f"Model: {info['model']} — cross-validated MAE €{best['mae']:,.0f}, R² {best['r2']:.2f}")
+    elif training_error is not None:
+        st.caption("Model: linear regression per position baseline")
+        st.warning(f"Background model training failed: {training_error}")
+        if st.button("Retry training"):
+            start_training.clear()
+            st.rerun()
+    else:
+        st.caption("Model: linear regression per position baseline (a better model is being selected in the background)")
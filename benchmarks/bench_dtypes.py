@@ -0,0 +1,51 @@
+"""Measure memory and filter speed of the compacted player table against plain dtypes.
+
+Run from the repository root:  python -m benchmarks.bench_dtypes
+"""
+import time
+import numpy as np
+import pandas as pd
+from player_data import compact_dtypes, load_players, memory_usage
+
+def multi_season(players, seasons):
+    """The processed table repeated once per season, as merged scrapes look"""
+    return pd.concat([players] * seasons, ignore_index=True)
+
+def plain(df):
+    """Same table with the dtypes the cleaner produced before compaction"""
+    types = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            types[col] = str
+        elif pd.api.types.is_integer_dtype(dtype):
+            types[col] = np.int64
+        elif pd.api.types.is_float_dtype(dtype):
+            types[col] = np.float64
+    return df.astype(types)
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main(seasons=200):
+    players = load_players()
+    wide = plain(multi_season(players, seasons))
+    compact = compact_dtypes(wide.copy())
+    print(f"{len(wide):,} rows ({seasons} seasons of {len(players)} players)")
+
+    before, after = memory_usage(wide), memory_usage(compact)
+    print(f"memory: {before / 1e6:8.1f} MB -> {after / 1e6:6.1f} MB ({before / after:.1f}x smaller)")
+    for col in wide.columns:
+        print(f"  {col:14} {str(wide[col].dtype):8} -> {str(compact[col].dtype):9} "
+              f"{memory_usage(wide[[col]]) / 1e6:7.1f} MB -> {memory_usage(compact[[col]]) / 1e6:6.1f} MB")
+
+    positions = list(players['Position'].unique()[:3])
+    clubs = list(players['Club'].unique()[:5])
+    for name, frame in [("plain", wide), ("compact", compact)]:
+        ms = timed(lambda: frame['Position'].isin(positions) & ~frame['Club'].isin(clubs))
+        print(f"{name:8} isin filter on Position + Club: {ms:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
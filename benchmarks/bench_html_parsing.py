@@ -0,0 +1,89 @@
+"""Benchmark the scraper's HTML parser backends on listing pages.
+
+Parses every fixture with the old setup (html.parser, whole page) and with each
+available backend restricted to the players table, checks that
+parse_players_table returns identical rows and reports the per-page parse time.
+
+Run from the repository root:
+    python -m benchmarks.bench_html_parsing [fixture.html ...]
+Without arguments the pages in the scraper's HTTP cache are used, or synthetic
+pages when the cache is empty.
+"""
+import glob
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import parsing  # noqa: E402
+from fetcher import DEFAULT_CACHE_DIR  # noqa: E402
+from scrapper import parse_players_table  # noqa: E402
+
+def synthetic_page(page, rows=25):
+    """Listing page in the flat 14-cell row layout parse_players_table reads, with navigation around the table"""
+    noise = "".join(f'<li><a href="/nav/{i}" class="menu">Link {i}</a><span>Text {i}</span></li>' for i in range(1500))
+    body = []
+    for i in range(rows):
+        n = page * rows + i
+        body.append(
+            f'<tr class="{"odd" if i % 2 == 0 else "even"}"><td>{n + 1}</td>'
+            f'<td class="hauptlink"><a class="spielprofil_tooltip" href="/player-{n}/profil/spieler/{1000 + n}">Player {n}</a></td>'
+            f'<td><img title="Spain" class="flaggenrahmen"/><img title="Brazil" class="flaggenrahmen"/></td>'
+            f'<td><img alt="Club {n % 20}"/></td><td>Centre-Back</td><td>{18 + n % 15}</td>'
+            f'<td>€{n % 90 + 1}.00m</td>'
+            + "".join(f"<td>{(n * k) % 40}</td>" for k in range(1, 8))
+            + "</tr>"
+        )
+    return (
+        f'<html><head><title>Most valuable players</title></head><body><ul class="nav">{noise}</ul>'
+        f'<table class="items"><thead><tr><th>#</th></tr></thead><tbody>{"".join(body)}</tbody></table>'
+        f'<footer><ul>{noise}</ul></footer></body></html>'
+    )
+
+def load_fixtures(paths):
+    if not paths:
+        paths = glob.glob(os.path.join(DEFAULT_CACHE_DIR, "bodies", "*"))
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        if 'class="items"' in html:
+            pages.append(html)
+    return pages or [synthetic_page(p) for p in range(20)]
+
+def parse_all(pages, make_soup):
+    """Rows of every page and the mean seconds per page"""
+    start = time.perf_counter()
+    rows, current_id = [], 1
+    for html in pages:
+        players, current_id = parse_players_table(make_soup(html), current_id)
+        rows.extend(players)
+    return rows, (time.perf_counter() - start) / len(pages)
+
+def check_synthetic(rows):
+    """The synthetic pages must parse into real fields, or comparing backends proves nothing"""
+    first = rows[0]
+    assert (first["Player"], first["Position"], first["Age"]) == ("Player 0", "Centre-Back", "18"), first
+    assert (first["Nationality"], first["Club"], first["MarketValue"]) == ("Spain, Brazil", "Club 0", "€1.00m"), first
+
+def main(paths):
+    pages = load_fixtures(paths)
+    print(f"Parsing {len(pages)} listing pages")
+
+    baseline, baseline_time = parse_all(pages, lambda html: BeautifulSoup(html, "html.parser"))
+    if not paths and pages[0] == synthetic_page(0):
+        check_synthetic(baseline)
+    print(f"html.parser, full page:   {baseline_time * 1000:8.2f} ms/page")
+
+    backends = ["html.parser"] + (["lxml"] if parsing.FAST_PARSER == "lxml" else [])
+    for backend in backends:
+        parsing.set_parser(backend)
+        rows, per_page = parse_all(pages, lambda html: parsing.make_soup(html, only=parsing.PLAYERS_TABLE))
+        assert rows == baseline, f"{backend} produced different rows"
+        print(f"{backend + ', table only:':25} {per_page * 1000:8.2f} ms/page  ({baseline_time / per_page:.1f}x)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,47 @@
+"""Benchmark the vectorized MarketValue parser against the old eval-based convert_value.
+
+Run from the repository root:  python -m benchmarks.bench_market_values
+"""
+import time
+import numpy as np
+import pandas as pd
+from player_data import parse_market_values
+
+def convert_value(val):
+    """Previous per-row parser, kept here as the baseline"""
+    if isinstance(val, str):
+        val = val.replace('€', '').replace('m', 'e6').replace('M', 'e6').replace('k', 'e3').strip()
+        try:
+            return float(eval(val))
+        except:
+            return None
+    return val
+
+def synthetic_values(n, seed=0):
+    """Market value strings in the shapes the scrapers produce"""
+    rng = np.random.default_rng(seed)
+    millions = [f"€{v:.2f}m" for v in np.arange(0.5, 200.5, 0.5)]
+    thousands = [f"€{v}k" for v in range(25, 1000, 25)]
+    pool = np.array(millions + thousands + ["-"], dtype=object)
+    return pd.Series(pool[rng.integers(0, len(pool), n)])
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main(n=1_000_000):
+    values = synthetic_values(n)
+    print(f"Parsing {n:,} synthetic MarketValue strings")
+
+    old, old_time = timed(lambda s: s.apply(convert_value).astype(float), values)
+    new, new_time = timed(parse_market_values, values)
+
+    # '-' placeholders make eval raise, so both parsers must agree on NaN as well as values
+    assert np.allclose(old.to_numpy(), new.to_numpy(), equal_nan=True), "parsers disagree"
+
+    print(f"convert_value (apply + eval): {old_time:8.3f} s")
+    print(f"parse_market_values:          {new_time:8.3f} s  ({old_time / new_time:.0f}x faster)")
+
+if __name__ == "__main__":
+    main()
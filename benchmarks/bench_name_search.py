@@ -0,0 +1,36 @@
+"""Time typeahead queries on the name search index over a large synthetic player list.
+
+Run from the repository root:  python -m benchmarks.bench_name_search
+"""
+import time
+import numpy as np
+from player_data import load_players
+from recommend import NameSearchIndex
+
+QUERIES = ["k", "ky", "kylian", "kylian mb", "mbappe", "mbape", "bellingam", "zzz"]
+
+def synthetic_names(players, n, seed=0):
+    """Real first and last names recombined, so prefixes and trigrams look like the real thing"""
+    rng = np.random.default_rng(seed)
+    words = players['SearchName'].astype(str).str.split()
+    firsts, lasts = words.str[0].unique(), words.str[-1].unique()
+    return [f"{rng.choice(firsts)} {rng.choice(lasts)}{rng.integers(0, 50)}" for _ in range(n)]
+
+def main(n=500_000, repeat=50):
+    players = load_players()
+    names = synthetic_names(players, n)
+    values = np.random.default_rng(1).random(n)
+
+    start = time.perf_counter()
+    index = NameSearchIndex(names, values)
+    print(f"Built the index over {n:,} names in {time.perf_counter() - start:.1f}s")
+
+    for query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            found = index.search(query, limit=20)
+        ms = (time.perf_counter() - start) / repeat * 1000
+        print(f"  {query!r:12} {len(found):2} matches  {ms:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
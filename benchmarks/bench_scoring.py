@@ -0,0 +1,34 @@
+"""Time re-ranking the players with new scoring weights, as a slider change does in the app.
+
+Run from the repository root:  python -m benchmarks.bench_scoring
+"""
+import time
+import numpy as np
+from market_model import ML_FEATURES, fit_baseline, score_players
+from player_data import load_players
+from recommend import SCORE_TERMS, PlayerIndex, ScoringEngine
+from benchmarks.bench_dtypes import multi_season, timed
+
+def main(seasons=1000, k=50):
+    players = load_players()
+    model, _ = fit_baseline(players, ML_FEATURES)
+    df = score_players(multi_season(players, seasons), model, ML_FEATURES)
+    print(f"{len(df):,} rows ({seasons} seasons of {len(players)} players)")
+
+    start = time.perf_counter()
+    engine = ScoringEngine(df)
+    print(f"build (terms + normalization stats): {(time.perf_counter() - start) * 1000:7.1f} ms")
+
+    index = PlayerIndex(df)
+    mask = index.mask(30_000_000, positions=list(index.positions[:6]), undervalued=True)
+    rng = np.random.default_rng(0)
+    weights = [dict(zip(SCORE_TERMS, w)) for w in rng.uniform(0, 2, size=(20, len(SCORE_TERMS)))]
+    it = iter(weights * 3)
+
+    print(f"filter mask:                         {timed(lambda: index.mask(30_000_000, undervalued=True)):7.1f} ms")
+    print(f"re-rank filtered, top {k}:            {timed(lambda: engine.top(next(it), k, mask)):7.1f} ms")
+    print(f"re-rank all rows, top {k}:            {timed(lambda: engine.top(next(it), k)):7.1f} ms")
+    print(f"re-rank all rows, full argsort:      {timed(lambda: np.argsort(-engine.scores(next(it)))):7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark the squad optimizer and check it against brute force.
+
+Run from the repository root:  python -m benchmarks.bench_squad_optimizer
+"""
+import itertools
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from recommend import optimize_squad
+
+POSITIONS = ['Goalkeeper', 'Centre-Back', 'Central Midfield', 'Centre-Forward']
+
+def synthetic_players(n, seed=0):
+    """Random candidates with market values in €100k steps, a noisy value gap and a predicted value
+
+    PredictedValue rises with the price, so hardly any candidate is dominated by a
+    cheaper, better one: the worst case for the optimizer's pruning.
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.integers(1, 1500, n) * 100_000.0
+    return pd.DataFrame({
+        'Position': rng.choice(POSITIONS, n),
+        'Club': rng.choice([f'Club {i}' for i in range(40)], n),
+        'MarketValue': values,
+        'ValueGap': rng.normal(0, 0.3, n) * values + rng.normal(0, 5e6, n),
+        'PredictedValue': values * 1.1 + rng.normal(0, 1e5, n),
+    })
+
+def brute_force(df, budget, quotas, objective='ValueGap'):
+    """Best total `objective` by trying every combination (small inputs only)"""
+    per_group = []
+    for position, quota in quotas.items():
+        rows = np.flatnonzero(df['Position'].to_numpy() == position)
+        per_group.append(list(itertools.combinations(rows, quota)))
+
+    values = df['MarketValue'].to_numpy()
+    gaps = df[objective].to_numpy()
+    best = None
+    for picks in itertools.product(*per_group):
+        rows = [r for group in picks for r in group]
+        if values[rows].sum() <= budget:
+            score = gaps[rows].sum()
+            best = score if best is None else max(best, score)
+    return best
+
+def check_exactness(trials=200):
+    rng = np.random.default_rng(1)
+    for trial in range(trials):
+        df = synthetic_players(int(rng.integers(6, 14)), seed=trial)
+        quotas = {position: int(rng.integers(0, 3)) for position in POSITIONS}
+        budget = float(rng.integers(5, 400)) * 1_000_000
+
+        objective = ('ValueGap', 'PredictedValue')[trial % 2]
+
+        squad = optimize_squad(df, budget, quotas, objective=objective)
+        expected = brute_force(df, budget, quotas, objective)
+        if expected is None:
+            assert len(squad) == 0, f"trial {trial}: found a squad where none fits"
+            continue
+        assert df['MarketValue'].to_numpy()[squad].sum() <= budget
+        assert np.isclose(df[objective].to_numpy()[squad].sum(), expected), f"trial {trial}: not optimal"
+    print(f"Exact on {trials} random small inputs (checked against brute force)")
+
+def main(n=50_000):
+    check_exactness()
+
+    df = synthetic_players(n)
+    quotas = {'Goalkeeper': 1, 'Centre-Back': 4, 'Central Midfield': 3, 'Centre-Forward': 3}
+    for objective in ('ValueGap', 'PredictedValue'):
+        for budget in (100e6, 300e6, 800e6):
+            start = time.perf_counter()
+            squad = optimize_squad(df, budget, quotas, objective=objective)
+            elapsed = time.perf_counter() - start
+            tracemalloc.start()  # a second run, tracing slows it down
+            optimize_squad(df, budget, quotas, objective=objective)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            exact = optimize_squad(df, budget, quotas, objective=objective, max_work=np.inf)
+            chosen = df.iloc[squad]
+            print(f"{objective:14} {n:,} candidates, budget €{budget / 1e6:.0f}m: {elapsed * 1000:6.1f} ms, "
+                  f"peak {peak / 1e6:5.1f} MB, cost €{chosen['MarketValue'].sum() / 1e6:.1f}m, "
+                  f"{objective} €{chosen[objective].sum() / 1e6:.1f}m "
+                  f"(unbounded €{df[objective].to_numpy()[exact].sum() / 1e6:.1f}m)")
+
+if __name__ == "__main__":
+    main()
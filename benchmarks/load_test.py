@@ -0,0 +1,62 @@
+"""Load-test the scoring service and report latency percentiles and throughput.
+
+Start the service first, then run from the repository root:
+    python service.py --workers 4
+    python -m benchmarks.load_test --endpoint predict --requests 5000 --concurrency 64
+"""
+import argparse
+import json
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+PLAYER = {'Age': 25, 'Goals': 10, 'Assists': 5, 'MatchesPlayed': 30, 'YellowCards': 2, 'OwnGoals': 0}
+
+def make_request(base_url, endpoint, player_name):
+    if endpoint == "predict":
+        body = json.dumps({"players": [PLAYER]}).encode("utf-8")
+        return urllib.request.Request(
+            f"{base_url}/predict", data=body, headers={"Content-Type": "application/json"}
+        )
+    if endpoint == "recommend":
+        query = urllib.parse.urlencode({"budget": 30_000_000, "undervalued": "true", "limit": 20})
+        return urllib.request.Request(f"{base_url}/recommend?{query}")
+    query = urllib.parse.urlencode({"player": player_name, "k": 10})
+    return urllib.request.Request(f"{base_url}/similar?{query}")
+
+def timed_call(request):
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=30) as res:
+        res.read()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["predict", "recommend", "similar"], default="predict")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--player", default="Lamine Yamal", help="reference player for /similar")
+    args = parser.parse_args()
+
+    request = make_request(args.url.rstrip("/"), args.endpoint, args.player)
+    timed_call(request)  # warm up the connection and the worker
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        started = time.perf_counter()
+        latencies = np.array(list(pool.map(timed_call, [request] * args.requests)))
+        elapsed = time.perf_counter() - started
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"/{args.endpoint}: {args.requests} requests, {args.concurrency} concurrent clients")
+    print(f"  p50 {p50:.1f} ms   p99 {p99:.1f} ms   {args.requests / elapsed:,.0f} req/s")
+
+    with urllib.request.urlopen(f"{args.url.rstrip('/')}/health", timeout=30) as res:
+        health = json.load(res)
+    if args.endpoint == "predict":
+        print(f"  one worker answered with {health['batches']} predict batches so far")
+
+if __name__ == "__main__":
+    main()
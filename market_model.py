@@ -0,0 +1,392 @@
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+
+import joblib
+import numpy as np
+import openpyxl
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from openpyxl.utils.exceptions import InvalidFileException
+from sklearn.base import clone
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import KFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from player_data import DATA_PATH, POSITION_GROUPS, dataset_fingerprint, load_players, position_groups
+
+# Manifest of the current model artifact, written by `python market_model.py train`
+MODEL_PATH = "models/market_value.json"
+ARTIFACT_FORMAT = 2
+
+ML_FEATURES = ['Age', 'Goals', 'Assists', 'MatchesPlayed', 'YellowCards', 'OwnGoals']
+
+# ---------------------- Candidate Models ----------------------
+
+def log_target(regressor):
+    """Fit on log(MarketValue) and predict back in euros, values are heavily right-skewed"""
+    # exp(log(x)) is exact up to float rounding, which the inverse check flags at euro scale
+    return TransformedTargetRegressor(regressor=regressor, func=np.log, inverse_func=np.exp, check_inverse=False)
+
+CANDIDATES = {
+    "linear": LinearRegression(),
+    "ridge": make_pipeline(StandardScaler(), Ridge(alpha=1.0)),
+    "ridge_log": log_target(make_pipeline(StandardScaler(), Ridge(alpha=1.0))),
+    "hist_gb": HistGradientBoostingRegressor(max_iter=200, learning_rate=0.05, random_state=0),
+    "hist_gb_log": log_target(HistGradientBoostingRegressor(max_iter=200, learning_rate=0.05, random_state=0)),
+}
+
+# Suffix of the per-position ensemble of a candidate, e.g. "ridge_log_by_position"
+BY_POSITION = "_by_position"
+# Position groups with fewer training rows than this are left to the global model
+MIN_GROUP_ROWS = 50
+
+def _rows(X, rows):
+    return X.iloc[rows] if hasattr(X, "iloc") else X[rows]
+
+def _fit(estimator, X, y):
+    return clone(estimator).fit(X, y)
+
+class PositionEnsemble:
+    """One model per position group (see POSITION_GROUPS) next to a global model
+
+    Goalkeepers, defenders and attackers are priced on very different stats, so a
+    single model over- or under-values whole groups. Groups with fewer than
+    `min_rows` training rows, and rows whose group is unknown (-1), use the global model.
+    """
+
+    def __init__(self, estimator, min_rows=MIN_GROUP_ROWS):
+        self.estimator = estimator
+        self.min_rows = min_rows
+
+    def fit(self, X, y, groups, n_jobs=1):
+        """Fit the global model and every large enough group, in parallel worker processes"""
+        groups = np.asarray(groups)
+        jobs = [(None, np.ones(len(X), dtype=bool))] + [
+            (group, groups == group) for group in range(len(POSITION_GROUPS))
+            if np.count_nonzero(groups == group) >= self.min_rows
+        ]
+        fitted = Parallel(n_jobs=n_jobs)(delayed(_fit)(self.estimator, _rows(X, rows), y[rows]) for _, rows in jobs)
+        self.global_model = fitted[0]
+        self.models = {group: model for (group, _), model in zip(jobs[1:], fitted[1:])}
+        return self
+
+    def predict(self, X, groups=None):
+        """Predict each group's rows in one call to its model, the rest with the global model"""
+        if groups is None:
+            return self.global_model.predict(X)
+        groups = np.where(np.isin(groups, list(self.models)), groups, -1)  # -1: the global model
+        present = np.unique(groups)
+        if len(present) == 1:  # e.g. a batch without positions, no rows to select
+            return self.models.get(present[0], self.global_model).predict(X)
+        predicted = np.empty(len(X))
+        for group in present:
+            rows = groups == group
+            predicted[rows] = self.models.get(group, self.global_model).predict(_rows(X, rows))
+        return predicted
+
+def make_model(name):
+    """Unfitted model for a candidate name, or its per-position ensemble for '<name>_by_position'"""
+    if name.endswith(BY_POSITION):
+        return PositionEnsemble(CANDIDATES[name[:-len(BY_POSITION)]])
+    return clone(CANDIDATES[name])
+
+def model_names():
+    return list(CANDIDATES) + [name + BY_POSITION for name in CANDIDATES]
+
+def fit_model(model, X, y, groups, n_jobs=1):
+    return model.fit(X, y, groups, n_jobs) if isinstance(model, PositionEnsemble) else model.fit(X, y)
+
+def predict_values(model, X, groups=None):
+    """Predict with any model, position ensembles use the group codes when given"""
+    return model.predict(X, groups) if isinstance(model, PositionEnsemble) else model.predict(X)
+
+def known_groups(positions):
+    """Position group code of every position, -1 (the global model) where it is missing"""
+    positions = pd.Series(positions, dtype=object)
+    return np.where(positions.isna() | (positions == ""), -1, position_groups(positions)).astype(np.int8)
+
+def player_groups(df):
+    """Position group code of every row, or None if the table has no positions"""
+    return known_groups(df['Position']) if 'Position' in df.columns else None
+
+def training_data(df, features):
+    """Rows with every feature and a positive market value, with their position groups"""
+    ml_df = df[list(features) + ['MarketValue']].dropna()
+    ml_df = ml_df[ml_df['MarketValue'] > 0]
+    return ml_df[list(features)], ml_df['MarketValue'], position_groups(df.loc[ml_df.index, 'Position'])
+
+def fit_baseline(df, features):
+    """Linear regression per position group, cheap enough to fit while the app starts"""
+    X, y, groups = training_data(df, features)
+    model = make_model("linear" + BY_POSITION)
+    model.fit(X, y, groups)
+    return model, {"model": "linear" + BY_POSITION, "features": list(features), "cv": None}
+
+def score_players(df, model, features):
+    """Add PredictedValue and ValueGap (predicted minus actual value) for every player"""
+    X_all = df[list(features)].fillna(0)  # Fill missing stats with 0 for prediction
+    predicted = predict_values(model, X_all, player_groups(df))
+    return df.assign(PredictedValue=predicted, ValueGap=predicted - df['MarketValue'])
+
+# ---------------------- Cross-Validation ----------------------
+
+def _score_fold(name, X, y, groups, train_idx, test_idx):
+    model = fit_model(make_model(name), X.iloc[train_idx], y.iloc[train_idx], groups[train_idx])
+    predicted = predict_values(model, X.iloc[test_idx], groups[test_idx])
+    actual = y.iloc[test_idx]
+    return name, mean_absolute_error(actual, predicted), r2_score(actual, predicted)
+
+def compare_models(X, y, groups, candidates=None, folds=5, n_jobs=-1):
+    """Cross-validate every candidate (global and per position) in one parallel joblib run, returning metrics per model"""
+    candidates = list(candidates or model_names())
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=0).split(X))
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_score_fold)(name, X, y, groups, train_idx, test_idx)
+        for name in candidates
+        for train_idx, test_idx in splits
+    )
+
+    metrics = {}
+    for name in candidates:
+        scores = [(mae, r2) for model, mae, r2 in results if model == name]
+        metrics[name] = {
+            "mae": float(np.mean([mae for mae, _ in scores])),
+            "r2": float(np.mean([r2 for _, r2 in scores])),
+        }
+    return metrics
+
+def train_best_model(df, features, candidates=None, folds=5, n_jobs=-1):
+    """Pick the candidate with the lowest cross-validated MAE and refit it on all rows"""
+    X, y, groups = training_data(df, features)
+    folds = max(2, min(folds, len(X)))
+    metrics = compare_models(X, y, groups, candidates, folds, n_jobs)
+    best = min(metrics, key=lambda name: metrics[name]["mae"])
+
+    model = fit_model(make_model(best), X, y, groups, n_jobs)
+    return model, {"model": best, "features": list(features), "cv": metrics}
+
+# ---------------------- Model Artifacts ----------------------
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def save_model(model, info, fingerprint, schema=None, path=MODEL_PATH, keep=5):
+    """Write a versioned model artifact and point the manifest at it
+
+    The artifact is `<name>-<version>.joblib` next to the manifest, which records the
+    feature schema, the dataset fingerprint and the artifact's SHA-256. The manifest is
+    replaced last, so readers only ever see complete artifacts.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    version = time.strftime("%Y%m%dT%H%M%S") + f"-{fingerprint[:8]}"
+    artifact_path = os.path.join(directory, f"{stem}-{version}.joblib")
+
+    joblib.dump({"format": ARTIFACT_FORMAT, "model": model}, artifact_path)
+    manifest = dict(
+        info,
+        format=ARTIFACT_FORMAT,
+        version=version,
+        artifact=os.path.basename(artifact_path),
+        sha256=_sha256(artifact_path),
+        fingerprint=fingerprint,
+        schema=schema or {},
+        sklearn=sklearn.__version__,
+        trained_at=time.time(),
+    )
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+    # Only keep the most recent artifacts around
+    old = sorted(glob.glob(os.path.join(directory, f"{stem}-*.joblib")))[:-keep]
+    for old_path in old:
+        os.remove(old_path)
+    return manifest
+
+def read_artifact(path=MODEL_PATH):
+    """Load the artifact the manifest points to as (model, manifest), or None if it is missing, corrupt or stale
+
+    The artifact's checksum is verified against the manifest before it is unpickled, and
+    artifacts pickled by another scikit-learn version are treated as stale.
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        return None
+    if manifest.get("sklearn") != sklearn.__version__:
+        print(f"Model artifact was built with scikit-learn {manifest.get('sklearn')}, not {sklearn.__version__}, ignoring it")
+        return None
+
+    artifact_path = os.path.join(os.path.dirname(path) or ".", manifest.get("artifact", ""))
+    if not os.path.isfile(artifact_path) or _sha256(artifact_path) != manifest.get("sha256"):
+        print(f"Model artifact {artifact_path} is missing or corrupt, ignoring it")
+        return None
+    try:
+        return joblib.load(artifact_path)["model"], manifest
+    except Exception as e:  # unpickling runs arbitrary class lookups, any of them may fail
+        print(f"Model artifact {artifact_path} cannot be loaded ({e!r}), ignoring it")
+        return None
+
+def load_model(fingerprint, features, path=MODEL_PATH):
+    """Load the current artifact if it was trained on this dataset and feature list, else None"""
+    loaded = read_artifact(path)
+    if loaded is None:
+        return None
+    manifest = loaded[1]
+    if manifest.get("fingerprint") != fingerprint or manifest.get("features") != list(features):
+        return None
+    return loaded
+
+def feature_schema(df, features):
+    return {name: str(df[name].dtype) for name in features}
+
+def train_in_background(df, features, fingerprint, path=MODEL_PATH):
+    """Run model selection on a daemon thread and persist the winner when done
+
+    A failure is printed and kept on `thread.error` so callers can report it.
+    """
+    def run():
+        try:
+            model, info = train_best_model(df, features)
+            save_model(model, info, fingerprint, feature_schema(df, features), path)
+        except Exception as e:
+            thread.error = e
+            print(f"Model training failed: {e!r}", file=sys.stderr)
+            return
+        print(f"Saved {info['model']} model to {path} (CV MAE €{info['cv'][info['model']]['mae']:,.0f})")
+
+    thread = threading.Thread(target=run, name="market-model-training", daemon=True)
+    thread.error = None
+    thread.start()
+    return thread
+
+# ---------------------- Batch Prediction ----------------------
+
+def validate_columns(columns, features=ML_FEATURES):
+    """Raise ValueError naming any model feature the uploaded sheet is missing"""
+    missing = [name for name in features if name not in set(columns)]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)} (expected {', '.join(features)})")
+
+# Raised by openpyxl for files that are not (valid) workbooks, e.g. a CSV renamed to .xlsx
+WORKBOOK_ERRORS = (zipfile.BadZipFile, InvalidFileException, KeyError)
+
+def iter_chunks(source, chunksize=50_000, name=None, required=None):
+    """Read a CSV or XLSX file (path or file object) as DataFrames of at most `chunksize` rows
+
+    The `required` columns are checked against the header before any row is read.
+    Unreadable files raise ValueError, like missing columns do.
+    """
+    name = (name or getattr(source, "name", None) or str(source)).lower()
+    if not name.endswith((".xlsx", ".xlsm")):
+        with pd.read_csv(source, chunksize=chunksize) as reader:  # a header-only file yields one empty chunk
+            for i, chunk in enumerate(reader):
+                if i == 0 and required is not None:
+                    validate_columns(chunk.columns, required)
+                yield chunk
+        return
+
+    # openpyxl's read-only mode streams rows instead of loading the whole workbook
+    try:
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except WORKBOOK_ERRORS as e:
+        raise ValueError(f"Could not read {name} as an Excel workbook ({e})") from e
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell) for cell in next(rows, ())]
+        if required is not None:
+            validate_columns(header, required)
+        while True:
+            chunk = list(itertools.islice(rows, chunksize))
+            if not chunk:
+                break
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()  # also when the caller stops early or a chunk fails
+
+def predict_file(model, source, output, features=ML_FEATURES, chunksize=50_000, name=None):
+    """Append a PredictedValue column to every row of `source` and write the result as CSV
+
+    Rows are predicted one chunk at a time, so memory stays bounded by `chunksize`.
+    A Position column, when present, selects the per-position models.
+    Returns the number of rows written.
+    """
+    total = 0
+    chunks = iter_chunks(source, chunksize, name, required=features)
+    try:
+        for i, chunk in enumerate(chunks):
+            X = chunk[list(features)].apply(pd.to_numeric, errors="coerce").fillna(0)
+            chunk["PredictedValue"] = predict_values(model, X, player_groups(chunk)) if len(chunk) else []
+            chunk.to_csv(output, header=(i == 0), index=False)
+            total += len(chunk)
+    finally:
+        chunks.close()
+    return total
+
+# ---------------------- CLI ----------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the market value model artifact and run batch predictions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="select, fit and save the model for the processed dataset")
+    train.add_argument("--data", default=DATA_PATH, help="processed player dataset")
+    train.add_argument("--output", default=MODEL_PATH, help="model manifest to write")
+    train.add_argument("--candidates", nargs="+", choices=model_names(), help="models to compare (default: all)")
+    train.add_argument("--folds", type=int, default=5)
+    train.add_argument("--jobs", type=int, default=-1, help="parallel worker processes for cross-validation and fitting")
+
+    predict = commands.add_parser("predict", help="predict market values for a CSV/XLSX of players")
+    predict.add_argument("input", help="CSV or XLSX file with the model feature columns")
+    predict.add_argument("--output", default="predictions.csv")
+    predict.add_argument("--model", default=MODEL_PATH, help="model manifest to use")
+    predict.add_argument("--chunksize", type=int, default=50_000)
+    args = parser.parse_args()
+
+    if args.command == "predict":
+        loaded = read_artifact(args.model)
+        if loaded is None:
+            parser.exit(1, f"No usable model at {args.model}, run `python market_model.py train` first\n")
+        model, manifest = loaded
+        try:
+            with open(args.output, "w", newline="", encoding="utf-8") as output:
+                count = predict_file(model, args.input, output, manifest["features"], args.chunksize)
+        except ValueError as e:
+            parser.exit(1, f"{e}\n")
+        print(f"Predicted {count} players with {manifest['model']} ({manifest['version']}) -> {args.output}")
+        return
+
+    df = load_players(args.data)
+    model, info = train_best_model(df, ML_FEATURES, args.candidates, args.folds, args.jobs)
+    for name, scores in info["cv"].items():
+        print(f"{name:22} MAE €{scores['mae']:>14,.0f}   R² {scores['r2']:.3f}")
+
+    manifest = save_model(model, info, dataset_fingerprint(args.data), feature_schema(df, ML_FEATURES), args.output)
+    print(f"Saved {manifest['model']} as version {manifest['version']} ({manifest['artifact']})")
+
+if __name__ == "__main__":
+    # Run through the importable module, so models such as PositionEnsemble are pickled
+    # as market_model.PositionEnsemble rather than __main__.PositionEnsemble
+    from market_model import main
+    main()
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import unicodedata
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional, we fall back to parsing the Excel file
+    pa = feather = None
+
+# Spreadsheet, CSV or Parquet (file or directory) as written by the scrapers
+DATA_PATH = os.environ.get("PLAYER_DATA", "data/processed/transfermarkt_players.xlsx")
+
+STAT_COLUMNS = ['Age', 'MatchesPlayed', 'Goals', 'OwnGoals', 'Assists', 'YellowCards', 'DoubleYellowCards', 'RedCards']
+
+# ---------------------- Helper Functions ----------------------
+
+@lru_cache(maxsize=65536)
+def fix_name(name):
+    """Clean player name for proper display"""
+    if not isinstance(name, str):
+        return name
+    # Undo UTF-8 text that was decoded as Latin-1 / Windows-1252 ('MbappÃ©' -> 'Mbappé')
+    for encoding in ('latin1', 'cp1252'):
+        try:
+            return unicodedata.normalize('NFC', name.encode(encoding).decode('utf-8'))
+        except UnicodeError:
+            continue
+    return name
+
+# Letters that NFKD does not decompose into a base letter plus accent
+FOLD_TABLE = str.maketrans({'ø': 'o', 'ß': 'ss', 'ł': 'l', 'æ': 'ae', 'œ': 'oe', 'đ': 'd', 'ı': 'i'})
+
+@lru_cache(maxsize=65536)
+def fold_name(name):
+    """Accent-folded, case-folded search key for a player name ('Mbappé' -> 'mbappe')"""
+    if not isinstance(name, str):
+        return ""
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.casefold().translate(FOLD_TABLE).strip()
+
+def clean_names(names):
+    """Repair a column of names, returning (display names, search keys)
+
+    Merged multi-season tables repeat the same players many times, so each distinct
+    raw name is repaired once and the results are mapped back through its codes.
+    """
+    names = pd.Series(names)
+    codes, uniques = pd.factorize(names)
+
+    repaired = np.array([fix_name(name) for name in uniques] + [None], dtype=object)
+    keys = np.array([fold_name(name) for name in repaired[:-1]] + [""], dtype=object)
+
+    # factorize marks missing names with -1, which picks the trailing placeholder
+    display = pd.Series(repaired[codes], index=names.index, name=names.name)
+    search = pd.Series(keys[codes], index=names.index, name='SearchName')
+    return display, search
+
+# Amounts such as '€30m', '€1.50bn', '€750k', '€1,200k' or plain numbers
+VALUE_PATTERN = r'^€?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s*(?P<unit>bn|m|k|th\.)?$'
+UNIT_SCALE = {'': 1.0, 'k': 1e3, 'th.': 1e3, 'm': 1e6, 'bn': 1e9}
+
+def parse_market_values(values):
+    """Convert a column of value strings like '€30m' into floats in one vectorized pass ('-' becomes NaN)"""
+    values = pd.Series(values)
+
+    # Scraped columns repeat the same few amounts, so only parse each distinct value once
+    codes, uniques = pd.factorize(values)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip().str.lower()
+    parts = text.str.extract(VALUE_PATTERN)
+
+    amounts = pd.to_numeric(parts['amount'].str.replace(',', '', regex=False), errors='coerce')
+    scale = parts['unit'].fillna('').map(UNIT_SCALE)
+    parsed = (amounts * scale).to_numpy(dtype=float)
+
+    result = np.full(len(codes), np.nan)
+    found = codes >= 0
+    result[found] = parsed[codes[found]]
+    return pd.Series(result, index=values.index, name=values.name)
+
+# Broad groups of Transfermarkt positions, for weights and models that differ by role
+POSITION_GROUPS = ('Goalkeeper', 'Defender', 'Midfielder', 'Attacker')
+
+def position_groups(positions):
+    """Group code (index into POSITION_GROUPS) of every position, e.g. 'Left-Back' -> Defender"""
+    codes, uniques = pd.factorize(pd.Series(positions).astype(object))
+
+    def group(position):
+        position = str(position)
+        if position == 'Goalkeeper':
+            return 0
+        if 'Back' in position or 'Defender' in position or 'Sweeper' in position:
+            return 1
+        if 'Midfield' in position:
+            return 2
+        return 3  # wingers, forwards and strikers
+
+    groups = np.array([group(position) for position in uniques] + [3], dtype=np.int8)
+    return groups[codes]  # missing positions (-1) pick the trailing default
+
+# Transfermarkt profile URLs end in /spieler/<id>, the only identifier that survives rescrapes
+SPIELER_ID = r'/spieler/(\d+)'
+
+def player_keys(df):
+    """Stable key per row: 'id:<spieler id>' from ProfileURL, else 'name:<folded name>@<folded club>'
+
+    Name-based keys change when a player moves club; the history store links them
+    back to the same player (see player_history.PlayerRegistry).
+    """
+    if df.empty:  # every row dropped while cleaning
+        return pd.Series([], index=df.index, dtype=str, name='PlayerKey')
+    # Cast both sides to str: an all-NaN or empty object column does not concatenate with str on pandas 3
+    clubs = df['Club'].astype(object).map(fold_name, na_action='ignore').fillna('').astype(str)
+    keys = 'name:' + df['SearchName'].astype(str) + '@' + clubs
+    if 'ProfileURL' in df.columns:
+        ids = df['ProfileURL'].astype(str).str.extract(SPIELER_ID)[0]
+        keys = ('id:' + ids.fillna('').astype(str)).where(ids.notna(), keys)
+    return keys.astype(str).rename('PlayerKey')
+
+# ---------------------- Clean Data ----------------------
+
+def read_source(source=DATA_PATH):
+    """Read the raw player table, picking the reader from the file extension"""
+    if source.endswith('.csv'):
+        return pd.read_csv(source)
+    if source.endswith('.parquet'):
+        return pd.read_parquet(source)
+    return pd.read_excel(source)
+
+def clean_players(df):
+    """Clean key fields of a raw player table"""
+    if 'Player' in df.columns:
+        df.rename(columns={'Player': 'PlayerName'}, inplace=True)
+
+    df['PlayerName'], df['SearchName'] = clean_names(df['PlayerName'])
+    df['MarketValue'] = parse_market_values(df['MarketValue'])
+
+    # Scraped stats are text and use '-' for "none"
+    for col in STAT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Drop players missing critical fields
+    df.dropna(subset=['MarketValue', 'Position', 'Club'], inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    df['PlayerKey'] = player_keys(df)
+
+    return compact_dtypes(df)
+
+# ---------------------- Column Types ----------------------
+
+# How each column is stored once cleaned. Counts get the smallest integer type that fits
+# their range (float32 when some are missing), so arithmetic on them should cast first.
+COLUMN_SCHEMA = dict(
+    {col: 'count' for col in STAT_COLUMNS},
+    ID='count',
+    MarketValue='amount',
+    Position='category',
+    Club='category',
+    Nationality='category',
+    PlayerName='label',
+    SearchName='label',
+    PlayerKey='label',
+)
+
+def _count_dtype(values):
+    """Smallest signed integer dtype holding every value, or float32 if some are missing or fractional"""
+    if values.isna().any() or not (values == np.floor(values)).all():
+        return np.float32
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def compact_dtypes(df):
+    """Convert columns to the compact types in COLUMN_SCHEMA, in place
+
+    Repeated labels become categoricals (names only when at most half are distinct,
+    as in multi-season tables), so filters compare small integer codes.
+    """
+    for col, kind in COLUMN_SCHEMA.items():
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if kind == 'count' and pd.api.types.is_numeric_dtype(values):
+            df[col] = values.astype(_count_dtype(values))
+        elif kind == 'amount':
+            df[col] = values.astype(np.float32)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        elif kind == 'category' or (kind == 'label' and values.nunique() <= len(values) // 2):
+            df[col] = values.astype('category')
+    return df
+
+def memory_usage(df):
+    """Bytes held by the frame, including the Python strings in object/str columns"""
+    return int(df.memory_usage(deep=True).sum())
+
+# ---------------------- Dataset Fingerprint ----------------------
+
+# Files up to SAMPLE_BLOCK * SAMPLE_COUNT bytes are hashed whole, larger ones are sampled
+SAMPLE_BLOCK = 64 * 1024
+SAMPLE_COUNT = 64
+
+@lru_cache(maxsize=4096)
+def _file_digest(path, mtime_ns, size):
+    """Hash of a file's size and contents, sampled in evenly spaced blocks when it is large
+
+    The mtime is only part of the cache key: a file that is rewritten with the same
+    bytes is re-sampled but keeps its digest.
+    """
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= SAMPLE_BLOCK * SAMPLE_COUNT:
+            digest.update(f.read())
+        else:
+            step = (size - SAMPLE_BLOCK) // (SAMPLE_COUNT - 1)
+            for i in range(SAMPLE_COUNT):  # first and last block included
+                f.seek(i * step)
+                digest.update(f.read(SAMPLE_BLOCK))
+    return digest.hexdigest()
+
+def source_files(source=DATA_PATH):
+    """The file behind `source`, or every data file of a directory dataset"""
+    if not os.path.isdir(source):
+        return [source]
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(source)
+        for name in names
+        if not name.startswith('.') and not name.endswith('.tmp')
+    )
+
+def dataset_fingerprint(source=DATA_PATH):
+    """Identify the dataset on disk from its files' sizes and sampled contents
+
+    Costs one `stat` per file while nothing changes, so it can be checked on every
+    rerun. Cached frames, derived columns and trained models are keyed by it.
+    """
+    digest = hashlib.sha1()
+    for path in source_files(source):
+        stat = os.stat(path)
+        digest.update(os.path.relpath(path, source).encode() if path != source else b'')
+        digest.update(_file_digest(path, stat.st_mtime_ns, stat.st_size).encode())
+    return digest.hexdigest()
+
+# ---------------------- Columnar Snapshot ----------------------
+
+def snapshot_path(source=DATA_PATH):
+    """Feather snapshot stored next to the source file"""
+    return os.path.splitext(source)[0] + ".feather"
+
+# Schema metadata key holding the fingerprint of the source the snapshot was built from
+SNAPSHOT_FINGERPRINT = b"dataset_fingerprint"
+
+def snapshot_fingerprint(table):
+    """Fingerprint of the source a snapshot table was built from, None for older snapshots"""
+    metadata = table.schema.metadata or {}
+    fingerprint = metadata.get(SNAPSHOT_FINGERPRINT)
+    return fingerprint.decode() if fingerprint else None
+
+def build_snapshot(source=DATA_PATH, fingerprint=None):
+    """Parse and clean the source once, then write an uncompressed Feather snapshot
+
+    The source's fingerprint is taken before reading and stored in the schema metadata,
+    so a source rewritten meanwhile (or with its old mtime kept) is rebuilt on next load.
+    """
+    fingerprint = fingerprint or dataset_fingerprint(source)
+    df = clean_players(read_source(source))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SNAPSHOT_FINGERPRINT] = fingerprint.encode()
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temp file first so a running app never maps a half-written snapshot
+    snapshot = snapshot_path(source)
+    tmp_path = snapshot + ".tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, snapshot)
+
+    return df
+
+def load_players(source=DATA_PATH):
+    """Load the cleaned player table, memory-mapping the snapshot when it matches the source"""
+    if feather is None:
+        return clean_players(read_source(source))
+
+    fingerprint = dataset_fingerprint(source)
+    snapshot = snapshot_path(source)
+    if os.path.exists(snapshot):
+        table = feather.read_table(snapshot, memory_map=True)
+        # Snapshots of other contents or written before player keys existed are rebuilt
+        if snapshot_fingerprint(table) == fingerprint and 'PlayerKey' in table.column_names:
+            return compact_dtypes(table.to_pandas())
+
+    return build_snapshot(source, fingerprint)
+
+if __name__ == "__main__":
+    raw = read_source()
+    before = memory_usage(raw)
+    players = build_snapshot()
+    print(f"Saved {len(players)} players to {snapshot_path()}")
+    print(f"Memory: {before / 1e6:.2f} MB as read, {memory_usage(players) / 1e6:.2f} MB cleaned and compacted")
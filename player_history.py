@@ -0,0 +1,319 @@
+import argparse
+import difflib
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+import pandas as pd
+from player_data import clean_players, fold_name, read_source
+
+# One store for every scrape, next to the processed dataset (shared by the app and the scrapers)
+HISTORY_PATH = os.environ.get(
+    "PLAYER_HISTORY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "processed", "history.sqlite"),
+)
+
+# Stored columns: store name -> cleaned table column
+VALUE_COLUMNS = {
+    'name': 'PlayerName',
+    'position': 'Position',
+    'club': 'Club',
+    'age': 'Age',
+    'market_value': 'MarketValue',
+    'matches': 'MatchesPlayed',
+    'goals': 'Goals',
+    'assists': 'Assists',
+}
+
+IDENTITIES_TABLE = (
+    "CREATE TABLE IF NOT EXISTS identities ("
+    " key TEXT PRIMARY KEY, player_key TEXT, name TEXT, club TEXT, birth_year INTEGER)"
+)
+
+# Fuzzy fallback: names at least this similar, within a year of the same birth year
+NAME_SIMILARITY = 0.85
+
+class PlayerRegistry:
+    """Resolves the player keys of each scrape to one canonical key per player
+
+    Keys from profile IDs are trusted as they are. A name-based key seen for the first
+    time (e.g. after a transfer, or from a scrape without profile URLs) is linked to a
+    known player with the same folded name and birth year (±1), or failing that to one
+    with a similar name, the same club and birth year. Candidates come from hash
+    indexes on the name and on (first/last name word, birth year), so resolving a scrape is O(n)
+    and never a pairwise comparison with every known player.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.db.execute(IDENTITIES_TABLE)
+        self.canonical = {}  # any key seen -> canonical player key
+        self.by_name = defaultdict(list)  # folded name -> [(player key, club, birth year)]
+        self.by_token = defaultdict(list)  # (first or last name token, birth year) -> [(player key, name, club)]
+        for key, player_key, name, club, birth_year in self.db.execute("SELECT * FROM identities"):
+            self._index(key, player_key, name, club, birth_year)
+
+    def _index(self, key, player_key, name, club, birth_year):
+        self.canonical[key] = player_key
+        self.by_name[name].append((player_key, club, birth_year))
+        if birth_year is not None:
+            for token in {name.split(' ', 1)[0], name.rsplit(' ', 1)[-1]}:
+                self.by_token[(token, birth_year)].append((player_key, name, club))
+
+    def _match(self, key, name, club, birth_year, taken):
+        """Canonical key of the known player this new key most likely belongs to, or None"""
+        def usable(player_key):
+            # Two profile IDs are always two players, and a scrape lists each player once
+            return player_key not in taken and not (key.startswith('id:') and player_key.startswith('id:'))
+
+        candidates = {
+            player_key: known_club == club
+            for player_key, known_club, known_year in self.by_name.get(name, ())
+            if usable(player_key) and (birth_year is None or known_year is None or abs(known_year - birth_year) <= 1)
+        }
+        if not candidates and birth_year is not None:
+            # A misspelt name usually keeps its first or last word
+            matcher = None
+            for token in {name.split(' ', 1)[0], name.rsplit(' ', 1)[-1]}:
+                for year in (birth_year - 1, birth_year, birth_year + 1):
+                    for player_key, known_name, known_club in self.by_token.get((token, year), ()):
+                        if known_club != club or not usable(player_key):
+                            continue
+                        if matcher is None:  # b is preprocessed once, then reused for every candidate
+                            matcher = difflib.SequenceMatcher(b=name)
+                        matcher.set_seq1(known_name)
+                        if matcher.real_quick_ratio() >= NAME_SIMILARITY and matcher.quick_ratio() >= NAME_SIMILARITY \
+                                and matcher.ratio() >= NAME_SIMILARITY:
+                            candidates[player_key] = True
+
+        same_club = [player_key for player_key, at_club in candidates.items() if at_club]
+        if len(same_club) == 1:
+            return same_club[0]
+        if len(candidates) == 1:
+            return next(iter(candidates))
+        return None  # unknown or ambiguous (namesakes): a new player
+
+    def resolve(self, df, year=None, register=True):
+        """Canonical player key of every row of a cleaned table scraped in `year`, registering new keys
+
+        With `register=False` new keys are only matched and nothing is stored. Without a
+        `year` the birth year is unknown, so new keys only match players of the same name.
+        """
+        keys = df['PlayerKey'].astype(str).tolist()
+        names = df['SearchName'].astype(str).tolist()
+        clubs = df['Club'].astype(object).map(fold_name, na_action='ignore').tolist()
+        ages = pd.to_numeric(df['Age'], errors='coerce').tolist() if 'Age' in df.columns else [None] * len(df)
+
+        resolved, taken, new = [], set(), []
+        for key, name, club, age in zip(keys, names, clubs, ages):
+            player_key = self.canonical.get(key)
+            if player_key is None:
+                birth_year = None if year is None or age is None or age != age else int(year - age)
+                player_key = self._match(key, name, club, birth_year, taken) or key
+                if register:
+                    self._index(key, player_key, name, club, birth_year)
+                    new.append((key, player_key, name, club, birth_year))
+            taken.add(player_key)
+            resolved.append(player_key)
+
+        self.db.executemany("INSERT OR REPLACE INTO identities VALUES (?, ?, ?, ?, ?)", new)
+        return resolved
+
+    def lookup(self, keys):
+        """Canonical keys for keys from a cleaned table (unknown keys are returned as they are)"""
+        return [self.canonical.get(key, key) for key in keys]
+
+# ---------------------- Snapshot Store ----------------------
+
+class ValueHistory:
+    """SQLite store of scraped player tables, one snapshot per scrape date and source
+
+    Values are indexed by (player, snapshot) and by snapshot, so a player's history and
+    the changes over the last few snapshots are range lookups instead of file reloads.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            " id INTEGER PRIMARY KEY, taken_on TEXT, source TEXT, players INTEGER, added_at REAL,"
+            " UNIQUE (taken_on, source));"
+            "CREATE TABLE IF NOT EXISTS player_values ("
+            " snapshot_id INTEGER, player_key TEXT, name TEXT, position TEXT, club TEXT, age INTEGER,"
+            " market_value REAL, matches INTEGER, goals INTEGER, assists INTEGER);"
+            "CREATE INDEX IF NOT EXISTS values_by_player ON player_values (player_key, snapshot_id);"
+            "CREATE INDEX IF NOT EXISTS values_by_snapshot ON player_values (snapshot_id);"
+            f"{IDENTITIES_TABLE};"
+        )
+        self.db.commit()
+        self._registry = None
+
+    @property
+    def registry(self):
+        """Identity resolver, only loaded into memory when a scrape is appended or a new key is matched"""
+        if self._registry is None:
+            self._registry = PlayerRegistry(self.db)
+        return self._registry
+
+    def lookup(self, keys, players=None):
+        """Canonical keys for keys from a cleaned table (unknown keys are returned as they are)
+
+        Reads only the requested rows of the identities table, by its primary key. Keys
+        never appended (e.g. name keys of a dataset without profile URLs) are matched by
+        name and club when their rows of the cleaned table are given as `players`,
+        without registering them.
+        """
+        keys = list(keys)
+        canonical = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            canonical.update(self.db.execute(
+                f"SELECT key, player_key FROM identities WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        unknown = [key for key in keys if key not in canonical]
+        if unknown and players is not None:
+            rows = players[players['PlayerKey'].astype(str).isin(unknown)].drop_duplicates('PlayerKey')
+            if len(rows):
+                with self.lock:
+                    matched = self.registry.resolve(rows, register=False)
+                canonical.update(zip(rows['PlayerKey'].astype(str), matched))
+        return [canonical.get(key, key) for key in keys]
+
+    def append(self, df, taken_on=None, source=""):
+        """Store a cleaned player table as the snapshot of `taken_on` (default today)
+
+        A second scrape of the same source on the same day replaces the first.
+        Returns the snapshot id.
+        """
+        taken_on = taken_on or time.strftime("%Y-%m-%d")
+        columns = [df[col].tolist() if col in df.columns else [None] * len(df) for col in VALUE_COLUMNS.values()]
+        with self.lock, self.db:
+            keys = self.registry.resolve(df, int(taken_on[:4]))
+            old = self.db.execute(
+                "SELECT id FROM snapshots WHERE taken_on = ? AND source = ?", (taken_on, source)
+            ).fetchone()
+            if old:
+                self.db.execute("DELETE FROM player_values WHERE snapshot_id = ?", old)
+                self.db.execute("DELETE FROM snapshots WHERE id = ?", old)
+            snapshot_id = self.db.execute(
+                "INSERT INTO snapshots (taken_on, source, players, added_at) VALUES (?, ?, ?, ?)",
+                (taken_on, source, len(df), time.time()),
+            ).lastrowid
+            self.db.executemany(
+                "INSERT INTO player_values VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((snapshot_id, key, *values) for key, *values in zip(keys, *columns)),
+            )
+        return snapshot_id
+
+    def snapshots(self):
+        return pd.read_sql_query("SELECT * FROM snapshots ORDER BY taken_on, id", self.db)
+
+    @staticmethod
+    def _recent(last):
+        # Subquery of the newest `last` snapshots, and its parameters
+        return "SELECT id, taken_on FROM snapshots ORDER BY taken_on DESC, id DESC LIMIT ?", [int(last)]
+
+    def _key_filter(self, keys, params):
+        if keys is None:
+            return ""
+        keys = sorted(set(self.lookup(keys)))
+        params.extend(keys)
+        return f" AND v.player_key IN ({', '.join('?' * len(keys))})"
+
+    def history(self, keys, last=10):
+        """Market value of the given players (PlayerKey values) in each of the last `last` snapshots"""
+        recent, params = self._recent(last)
+        where = self._key_filter(keys, params)
+        return pd.read_sql_query(
+            f"SELECT v.player_key, s.taken_on, v.name AS PlayerName, v.club AS Club, v.market_value AS MarketValue"
+            f" FROM ({recent}) s JOIN player_values v ON v.snapshot_id = s.id WHERE 1{where}"
+            f" ORDER BY v.player_key, s.taken_on, s.id",
+            self.db, params=params,
+        )
+
+    def value_deltas(self, last=2, keys=None):
+        """Change in market value between each player's oldest and newest of the last `last` snapshots"""
+        recent, params = self._recent(last)
+        where = self._key_filter(keys, params)
+        return pd.read_sql_query(
+            f"""
+            WITH ranked AS (
+                SELECT v.player_key, v.name, v.club, v.market_value, s.taken_on,
+                       ROW_NUMBER() OVER (PARTITION BY v.player_key ORDER BY s.taken_on DESC, s.id DESC) AS newest,
+                       ROW_NUMBER() OVER (PARTITION BY v.player_key ORDER BY s.taken_on, s.id) AS oldest
+                FROM ({recent}) s JOIN player_values v ON v.snapshot_id = s.id
+                WHERE v.market_value IS NOT NULL{where}
+            )
+            SELECT player_key,
+                   MAX(CASE WHEN newest = 1 THEN name END) AS PlayerName,
+                   MAX(CASE WHEN newest = 1 THEN club END) AS Club,
+                   MAX(CASE WHEN oldest = 1 THEN taken_on END) AS Since,
+                   MAX(CASE WHEN oldest = 1 THEN market_value END) AS FirstValue,
+                   MAX(CASE WHEN newest = 1 THEN market_value END) AS LatestValue,
+                   MAX(CASE WHEN newest = 1 THEN market_value END)
+                     - MAX(CASE WHEN oldest = 1 THEN market_value END) AS ValueDelta,
+                   COUNT(*) AS Snapshots
+            FROM ranked
+            GROUP BY player_key
+            ORDER BY ValueDelta DESC, PlayerName
+            """,
+            self.db, params=params,
+        )
+
+    def close(self):
+        self.db.close()
+
+# ---------------------- Scraper Integration ----------------------
+
+def add_history_arguments(parser):
+    """Register the snapshot store options shared by the scraper CLIs"""
+    parser.add_argument("--history", default=HISTORY_PATH, help="market value history store to append the scrape to")
+    parser.add_argument("--no-history", action="store_true", help="do not record this scrape in the history store")
+
+def append_output(source, path=HISTORY_PATH, taken_on=None):
+    """Clean a scraper output file and add it to the store as one snapshot"""
+    df = clean_players(read_source(source))
+    store = ValueHistory(path)
+    try:
+        store.append(df, taken_on, source=os.path.basename(os.path.normpath(source)))
+    finally:
+        store.close()
+    return len(df)
+
+def history_from_args(args, count):
+    """Append a finished scrape's output to the store unless --no-history was given"""
+    if args.no_history or not count:
+        return
+    added = append_output(args.output, args.history)
+    print(f"Recorded {added} players in the value history ({args.history})")
+
+# ---------------------- CLI ----------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Record scraped player tables and query market value changes")
+    parser.add_argument("--history", default=HISTORY_PATH, help="history store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="add a scraped CSV/XLSX/Parquet table as a snapshot")
+    add.add_argument("source")
+    add.add_argument("--date", help="scrape date as YYYY-MM-DD (default: today)")
+    deltas = commands.add_parser("deltas", help="biggest value changes over the last snapshots")
+    deltas.add_argument("--last", type=int, default=2, help="number of snapshots to compare")
+    deltas.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "add":
+        count = append_output(args.source, args.history, args.date)
+        print(f"Recorded {count} players from {args.source}")
+        return
+
+    store = ValueHistory(args.history)
+    changes = store.value_deltas(args.last)
+    store.close()
+    print(changes.head(args.top).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from player_data import fold_name, position_groups
+
+# ---------------------- Filter Index ----------------------
+
+class PlayerIndex:
+    """Precomputed sort orders and category codes for the Recommend tab filters
+
+    Rows are kept pre-sorted by MarketValue (so a budget is a `searchsorted` slice) and
+    by ValueGap (undervalued players are a prefix of that order), with the values and
+    position/club codes stored in each order so filters scan contiguous arrays. Filtering
+    returns row positions; the caller only materialises the rows it shows.
+    """
+
+    def __init__(self, df):
+        values = df['MarketValue'].to_numpy(dtype=float)
+        gaps = df['ValueGap'].to_numpy(dtype=float)
+        position_codes, self.positions = pd.factorize(df['Position'])
+        club_codes, self.clubs = pd.factorize(df['Club'])
+        position_codes = position_codes.astype(np.min_scalar_type(-len(self.positions)))
+        club_codes = club_codes.astype(np.min_scalar_type(-len(self.clubs)))
+        self.values, self.gaps = values, gaps
+        self.position_codes, self.club_codes = position_codes, club_codes
+
+        self.by_value = np.argsort(values, kind='stable')
+        self.sorted_values = values[self.by_value]
+        self.value_positions = position_codes[self.by_value]
+        self.value_clubs = club_codes[self.by_value]
+        self.value_undervalued = gaps[self.by_value] > 0
+
+        self.by_gap = np.argsort(-gaps, kind='stable')
+        self.undervalued_count = int(np.count_nonzero(gaps > 0))
+        self.gap_values = values[self.by_gap]
+        self.gap_positions = position_codes[self.by_gap]
+        self.gap_clubs = club_codes[self.by_gap]
+
+    @staticmethod
+    def _matches(codes, categories, selected):
+        """Boolean mask of rows whose category code is one of the `selected` categories"""
+        wanted = categories.get_indexer(list(selected))
+        wanted = wanted[wanted >= 0]
+        if len(wanted) <= 16:
+            # A few comparisons on small integer codes beat a gather over the whole column
+            mask = np.zeros(len(codes), dtype=bool)
+            for code in wanted:
+                mask |= codes == code
+            return mask
+        table = np.zeros(len(categories), dtype=bool)
+        table[wanted] = True
+        return np.take(table, codes, mode='clip') & (codes >= 0)
+
+    def _mask(self, position_codes, club_codes, positions, excluded_clubs):
+        mask = np.ones(len(position_codes), dtype=bool)
+        if positions and len(set(positions)) < len(self.positions):
+            mask &= self._matches(position_codes, self.positions, positions)
+        if excluded_clubs:
+            mask &= ~self._matches(club_codes, self.clubs, excluded_clubs)
+        return mask
+
+    def filter(self, budget, positions=None, excluded_clubs=None, undervalued=False, order='MarketValue'):
+        """Row positions matching the filters, sorted descending by `order` ('MarketValue' or 'ValueGap')"""
+        if order == 'ValueGap':
+            end = self.undervalued_count if undervalued else len(self.by_gap)
+            mask = self._mask(self.gap_positions[:end], self.gap_clubs[:end], positions, excluded_clubs)
+            mask &= self.gap_values[:end] <= budget
+            return np.compress(mask, self.by_gap[:end])
+
+        end = np.searchsorted(self.sorted_values, budget, side='right')
+        mask = self._mask(self.value_positions[:end], self.value_clubs[:end], positions, excluded_clubs)
+        if undervalued:
+            mask &= self.value_undervalued[:end]
+        return np.compress(mask, self.by_value[:end])[::-1]
+
+    def mask(self, budget, positions=None, excluded_clubs=None, undervalued=False):
+        """Boolean mask in row order of the players matching the filters"""
+        mask = self._mask(self.position_codes, self.club_codes, positions, excluded_clubs)
+        mask &= self.values <= budget
+        if undervalued:
+            mask &= self.gaps > 0
+        return mask
+
+# ---------------------- Similar Players ----------------------
+
+class SimilarityIndex:
+    """Nearest-neighbour search over standardized player stats plus position
+
+    Feature vectors are standardized once and kept as a float32 matrix with their
+    squared norms, so a query is one matrix-vector product and an `argpartition`.
+    """
+
+    def __init__(self, df, features, position_weight=1.0):
+        stats = df[list(features)].astype(float)
+        stats = stats.fillna(stats.median()).fillna(0)
+        scaled = StandardScaler().fit_transform(stats)
+
+        # One-hot positions so players in the same role are closer together
+        positions = pd.get_dummies(df['Position']).to_numpy(dtype=float) * position_weight
+
+        self.vectors = np.hstack([scaled, positions]).astype(np.float32)
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+
+    def similar(self, row, k=10, mask=None):
+        """Row positions and distances of the `k` players closest to row `row`
+
+        `mask` optionally restricts the candidates (e.g. undervalued or in-budget players).
+        """
+        query = self.vectors[row]
+        distances = self.norms - 2 * (self.vectors @ query) + self.norms[row]
+        distances[row] = np.inf  # never return the player itself
+        if mask is not None:
+            distances[~mask] = np.inf
+
+        k = min(k, int(np.isfinite(distances).sum()))
+        if k == 0:
+            return np.array([], dtype=np.intp), np.array([], dtype=np.float32)
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return nearest, np.sqrt(np.maximum(distances[nearest], 0))
+
+# ---------------------- Name Search ----------------------
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameSearchIndex:
+    """Typeahead search over accent-folded player names, best-known players first
+
+    Each name is indexed from the start of every word ('kylian mbappe', 'mbappe') in
+    one sorted list, so names with a word starting with the query are a bisected
+    range. Misspelt queries fall back to counting shared trigrams.
+    """
+
+    def __init__(self, names, values):
+        self.names = [name if isinstance(name, str) else "" for name in names]
+        self.values = np.nan_to_num(np.asarray(values, dtype=float), nan=-np.inf)
+
+        suffixes = sorted(
+            (name[start:], i)
+            for i, name in enumerate(self.names)
+            for start in [0] + [j + 1 for j, c in enumerate(name) if c == ' ']
+        )
+        self.suffixes = [suffix for suffix, _ in suffixes]
+        self.owners = np.array([i for _, i in suffixes], dtype=np.int32)
+
+        postings = defaultdict(list)
+        for i, name in enumerate(self.names):
+            for gram in _trigrams(name):
+                postings[gram].append(i)
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+    def _best(self, rows, limit):
+        """The `limit` distinct rows with the highest value, highest first"""
+        if len(rows) > 4 * limit:
+            rows = rows[np.argpartition(-self.values[rows], 4 * limit)[:4 * limit]]
+        rows = rows[np.argsort(-self.values[rows], kind='stable')]
+        _, first = np.unique(rows, return_index=True)
+        return rows[np.sort(first)][:limit]
+
+    def search(self, query, limit=20):
+        """Positions of up to `limit` names with a word starting with `query` (or close to it)
+
+        An empty query returns the most valuable players.
+        """
+        query = " ".join(fold_name(query).split())
+        if not query:
+            return self._best(np.arange(len(self.names)), limit)
+
+        lo = bisect_left(self.suffixes, query)
+        hi = bisect_left(self.suffixes, query + '\uffff', lo)
+        if hi > lo or len(query) < 3:
+            return self._best(self.owners[lo:hi], limit)
+
+        # No name has a word starting with the query, probably a typo: rank names
+        # sharing at least half of its trigrams, most shared first
+        grams = _trigrams(query)
+        postings = [self.postings[g] for g in grams if g in self.postings]
+        if not postings:
+            return np.array([], dtype=np.int32)
+        rows, shared = np.unique(np.concatenate(postings), return_counts=True)
+        keep = shared * 2 >= len(grams)
+        rows, shared = rows[keep], shared[keep]
+        return rows[np.lexsort((-self.values[rows], -shared))[:limit]]
+
+# ---------------------- Multi-Criteria Scoring ----------------------
+
+SCORE_TERMS = ('ValueGap', 'Age', 'Goals', 'Assists', 'Discipline')
+DEFAULT_WEIGHTS = {'ValueGap': 1.0, 'Age': 0.3, 'Goals': 0.5, 'Assists': 0.4, 'Discipline': 0.2}
+
+# How much each term counts per position group (rows follow POSITION_GROUPS, columns SCORE_TERMS)
+POSITION_WEIGHTS = np.array([
+    [1.0, 1.0, 0.0, 0.1, 1.0],  # Goalkeeper
+    [1.0, 1.0, 0.3, 0.5, 1.0],  # Defender
+    [1.0, 1.0, 0.7, 1.0, 1.0],  # Midfielder
+    [1.0, 1.0, 1.0, 0.8, 0.6],  # Attacker
+], dtype=np.float32)
+
+def _column(df, name):
+    """A stat column as float32, zeros when the source did not scrape it"""
+    if name not in df.columns:
+        return np.zeros(len(df), dtype=np.float32)
+    return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float32)
+
+class ScoringEngine:
+    """Weighted multi-criteria ranking of every player
+
+    Each term (relative value gap, age curve, goals and assists per match, cards per
+    match) is computed and standardized once, with its mean and standard deviation
+    kept in `stats`. A ranking is then a matrix product with the weights for each
+    position group and an `argpartition` for the top K, so changing weights never
+    sorts the whole table.
+    """
+
+    def __init__(self, df, peak_age=26.0):
+        matches = np.maximum(_column(df, 'MatchesPlayed'), 1)
+        market = np.maximum(_column(df, 'MarketValue'), 1e5)
+        predicted = np.maximum(_column(df, 'PredictedValue'), 1e5)
+        cards = _column(df, 'YellowCards') + 2 * _column(df, 'DoubleYellowCards') + 3 * _column(df, 'RedCards')
+
+        raw = np.column_stack([
+            np.log(predicted / market),  # how far the model values a player above their price
+            -((_column(df, 'Age') - peak_age) / 4) ** 2,  # best around the peak age
+            _column(df, 'Goals') / matches,
+            _column(df, 'Assists') / matches,
+            -cards / matches,
+        ])
+
+        mean, std = np.nanmean(raw, axis=0), np.nanstd(raw, axis=0)
+        std[~(std > 0)] = 1
+        self.stats = {term: (float(m), float(s)) for term, m, s in zip(SCORE_TERMS, mean, std)}
+        self.terms = np.nan_to_num((raw - mean) / std).astype(np.float32)  # missing stats score average
+        self.groups = position_groups(df['Position'])
+
+    def scores(self, weights=None):
+        """Score of every player for a dict of term weights (missing terms weigh 0)"""
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        w = np.array([weights.get(term, 0.0) for term in SCORE_TERMS], dtype=np.float32)
+        per_group = self.terms @ (POSITION_WEIGHTS * w).T  # one score column per position group
+        return np.take_along_axis(per_group, self.groups[:, None].astype(np.intp), axis=1)[:, 0]
+
+    def top(self, weights=None, k=50, mask=None):
+        """Row positions and scores of the `k` best players (within `mask`), best first"""
+        scores = self.scores(weights)
+        candidates = np.arange(len(scores)) if mask is None else np.flatnonzero(mask)
+        k = min(k, len(candidates))
+        if k == 0:
+            return np.array([], dtype=np.intp), np.array([], dtype=np.float32)
+        best = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return best, scores[best]
+
+# ---------------------- Squad Optimizer ----------------------
+
+# DP budget: candidates × quota × (cost buckets + ROW_OVERHEAD) cell updates, about 0.1 s
+MAX_SQUAD_WORK = 100_000_000
+# Per-candidate Python overhead of a DP step, in equivalent cell updates
+ROW_OVERHEAD = 10_000
+
+def _undominated(costs, scores, depth):
+    """Candidates that fewer than `depth` others beat on both cost (<=) and score (>=)
+
+    With at most `depth` players taken from a group, any candidate with `depth`
+    such rivals can be swapped for one of them, so dropping it keeps the optimum.
+    """
+    order = np.lexsort((-scores, costs))  # cheapest first, best score first on ties
+    keep, top = [], []  # top: min-heap of the `depth` best scores seen so far
+    for i, score in zip(order.tolist(), scores[order].tolist()):
+        if len(top) == depth and top[0] >= score:
+            continue
+        keep.append(i)
+        if len(top) < depth:
+            heapq.heappush(top, score)
+        else:
+            heapq.heapreplace(top, score)
+    return np.array(keep, dtype=np.intp)
+
+def optimize_squad(df, budget, quotas, objective='ValueGap', excluded_clubs=None, unit=100_000, max_buckets=20_000,
+                   max_work=MAX_SQUAD_WORK):
+    """Pick the squad that maximises the summed `objective` within a total budget
+
+    `quotas` maps a position (or a tuple of positions sharing a quota) to the exact
+    number of players wanted there. Costs are counted in buckets of `unit` euros,
+    rounded up so the squad never exceeds the budget; the answer is exact when market
+    values are multiples of `unit`. Coarser buckets are used past `max_buckets`, or
+    when the DP would cost more than `max_work` cell updates (see MAX_SQUAD_WORK),
+    which bounds the run time when few candidates can be pruned.
+    Returns the chosen row positions, or an empty array when no squad fits.
+    """
+    values = df['MarketValue'].to_numpy(dtype=float)
+    scores = df[objective].to_numpy(dtype=float)
+    eligible = (values <= budget) & ~np.isnan(scores)
+    if excluded_clubs:
+        eligible &= ~df['Club'].isin(excluded_clubs).to_numpy()
+
+    members, claimed = [], set()
+    for group, quota in quotas.items():
+        group = group if isinstance(group, tuple) else (group,)
+        if claimed & set(group):
+            raise ValueError(f"Position quotas overlap: {sorted(claimed & set(group))}")
+        claimed.update(group)
+        if quota > 0:
+            members.append((np.flatnonzero(eligible & df['Position'].isin(group).to_numpy()), quota))
+
+    def candidates(unit, members):
+        # Bucket costs, then keep each group's candidates that can be part of an optimum
+        capacity = int(np.floor(budget / unit + 1e-9))
+        costs = np.ceil(values / unit - 1e-9).astype(np.int64)
+        groups = [(rows[_undominated(costs[rows], scores[rows], quota)], quota) for rows, quota in members]
+        work = sum(len(rows) * quota for rows, quota in groups) * (capacity + 1 + ROW_OVERHEAD)
+        return capacity, costs, groups, work
+
+    unit = max(unit, budget / max_buckets)
+    capacity, costs, groups, work = candidates(unit, members)
+    while work > max_work:
+        # Coarser buckets only remove candidates, so the survivors are all that need re-pruning
+        unit *= max(1.25, np.sqrt(work / max_work))
+        capacity, costs, groups, work = candidates(unit, groups)
+
+    # Exact-cost knapsack over groups: best[c] is the top score spending exactly c buckets
+    best = np.full(capacity + 1, -np.inf)
+    best[0] = 0.0
+    trail = []
+    for rows, quota in groups:
+        table = np.full((quota + 1, capacity + 1), -np.inf)
+        table[0] = best
+        option = np.empty(capacity + 1)
+        better = np.zeros((quota, capacity + 1), dtype=bool)
+        # One bit per (player, count k >= 1, cost) decision, packed along the cost axis
+        taken = np.empty((len(rows), quota, (capacity + 8) // 8), dtype=np.uint8)
+        for j, row in enumerate(rows):
+            cost, score = costs[row], scores[row]
+            width = capacity + 1 - cost
+            better.fill(False)
+            for k in range(min(j + 1, quota), 0, -1):  # descending k: each player used once
+                current = table[k, cost:]
+                np.add(table[k - 1, :width], score, out=option[:width])
+                np.greater(option[:width], current, out=better[k - 1, cost:])
+                np.maximum(current, option[:width], out=current)
+            taken[j] = np.packbits(better, axis=1)
+        best = table[quota]
+        trail.append((rows, quota, taken))
+
+    if not np.isfinite(best).any():
+        return np.array([], dtype=np.intp)
+
+    # Walk the decisions backwards to recover which players were taken
+    spent = int(np.argmax(best))
+    squad = []
+    for rows, quota, taken in reversed(trail):
+        k = quota
+        for j in range(len(rows) - 1, -1, -1):
+            if k and taken[j, k - 1, spent >> 3] >> (7 - (spent & 7)) & 1:
+                squad.append(rows[j])
+                spent -= costs[rows[j]]
+                k -= 1
+    return np.array(squad[::-1], dtype=np.intp)
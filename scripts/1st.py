@@ -1,30 +1,33 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-import csv
+import argparse
+import os
+import sys
+import threading
+from fetcher import add_fetch_arguments, fetcher_from_args
+from journal import add_journal_arguments, journal_from_args
+from parsing import PLAYERS_TABLE, PROFILE_FACTS, add_parser_argument, make_soup, set_parser
+from sinks import write_rows
+
+# The snapshot store is shared with the app, which lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from player_history import add_history_arguments, history_from_args
 
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
 }
 
-def get_soup(url):
-    try:
-        res = requests.get(url, headers=headers)
-        res.raise_for_status()
-        return BeautifulSoup(res.text, "html.parser")
-    except Exception as e:
-        print(f"Error loading {url}: {e}")
-        return None
+STAT_KEYS = ["MatchesPlayed", "Goals", "OwnGoals", "Assists", "YellowCards", "DoubleYellowCards", "RedCards"]
 
-def scrape_profile_stats(profile_url):
-    soup = get_soup(profile_url)
-    stats = {
-        "MatchesPlayed": "", "Goals": "", "OwnGoals": "", "Assists": "",
-        "YellowCards": "", "DoubleYellowCards": "", "RedCards": ""
-    }
+def get_soup(fetcher, url, only=None):
+    html = fetcher.get(url)
+    return make_soup(html, only=only) if html is not None else None
 
+def scrape_profile_stats(fetcher, profile_url):
+    """Return the stats found on a player's profile page, or None if it could not be fetched"""
+    soup = get_soup(fetcher, profile_url, only=PROFILE_FACTS)
     if not soup:
-        return stats
+        return None
+
+    stats = dict.fromkeys(STAT_KEYS, "")
 
     try:
         stat_table = soup.select_one('div.large-6.columns > .profilheader')
@@ -55,7 +58,7 @@ def scrape_profile_stats(profile_url):
     return stats
 
 def scrape_player_data_from_url(html_content):
-    soup = BeautifulSoup(html_content, "html.parser")
+    soup = make_soup(html_content, only=PLAYERS_TABLE)
     players_data = []
     rows = soup.select("table.items > tbody > tr")
 
@@ -79,7 +82,8 @@ def scrape_player_data_from_url(html_content):
                 "Assists": "",
                 "YellowCards": "",
                 "DoubleYellowCards": "",
-                "RedCards": ""
+                "RedCards": "",
+                "ProfileURL": ""
             }
 
             player_info_table = cols[1].find("table", class_="inline-table")
@@ -88,9 +92,7 @@ def scrape_player_data_from_url(html_content):
                 if name_link_tag:
                     player_data["Player"] = name_link_tag.text.strip()
                     profile_relative_url = name_link_tag.get('href', '')
-                    profile_url = "https://www.transfermarkt.com" + profile_relative_url
-                    stats = scrape_profile_stats(profile_url)
-                    player_data.update(stats)
+                    player_data["ProfileURL"] = "https://www.transfermarkt.com" + profile_relative_url
 
                 # Position
                 position_row = player_info_table.find_all("tr")
@@ -113,45 +115,115 @@ def scrape_player_data_from_url(html_content):
 
     return players_data
 
-def get_all_player_data(base_url, num_pages=1):
-    all_players = []
+def enrich_with_profile_stats(fetcher, players, journal=None):
+    """Fetch every player's profile page on the worker pool and merge the stats back by URL
+
+    Profiles already in the journal with an unchanged market value are not fetched again.
+    """
+    market_values = {}
+    for p in players:
+        if p["ProfileURL"]:
+            market_values.setdefault(p["ProfileURL"], p["MarketValue"])
+
+    stats_by_url = {}
+    if journal:
+        for url, value in market_values.items():
+            stats = journal.profile_stats(url, value)
+            if stats is not None:
+                stats_by_url[url] = stats
+
+    profile_urls = [url for url in market_values if url not in stats_by_url]
+    counts = {"done": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def fetch_stats(profile_url):
+        stats = scrape_profile_stats(fetcher, profile_url)
+        if stats is not None and journal:
+            journal.record_profile(profile_url, market_values[profile_url], stats)
+        with lock:
+            counts["done"] += 1
+            counts["failed"] += stats is None
+            if counts["done"] % 25 == 0 or counts["done"] == len(profile_urls):
+                print(f"Profiles: {counts['done']}/{len(profile_urls)} fetched, {counts['failed']} failed")
+        return stats
+
+    print(f"\nEnriching {len(market_values)} players with profile stats "
+          f"({len(stats_by_url)} unchanged since the last run)...")
+    stats_by_url.update(zip(profile_urls, fetcher.map(fetch_stats, profile_urls)))
 
+    for player in players:
+        stats = stats_by_url.get(player["ProfileURL"])
+        if stats:
+            player.update(stats)
+
+    return players
+
+def scrape_listing_pages(fetcher, base_url, num_pages=1, journal=None):
+    """Yield the players of each listing page, stopping at the first page that fails"""
     for page_num in range(1, num_pages + 1):
+        players_on_page = journal.page_rows(page_num) if journal else None
+        if players_on_page is not None:
+            print(f"\nPage {page_num} already scraped, reusing {len(players_on_page)} players")
+            yield players_on_page
+            continue
+
         url = f"{base_url}?page={page_num}"
         print(f"\nFetching page {page_num}: {url}")
-        try:
-            res = requests.get(url, headers=headers)
-            res.raise_for_status()
-            html_content = res.text
-            players_on_page = scrape_player_data_from_url(html_content)
-            print(f"Scraped {len(players_on_page)} players from page {page_num}")
-            all_players.extend(players_on_page)
-            time.sleep(2)
-        except Exception as e:
-            print(f"Failed to fetch page {page_num}: {e}")
-            break
-
-    return all_players
+        html_content = fetcher.get(url)
+        if html_content is None:
+            print(f"Failed to fetch page {page_num}")
+            return
+
+        players_on_page = scrape_player_data_from_url(html_content)
+        print(f"Scraped {len(players_on_page)} players from page {page_num}")
+        if journal:
+            journal.record_page(page_num, players_on_page)
+        yield players_on_page
+
+def get_all_player_data(fetcher, base_url, num_pages=1, journal=None):
+    """Yield enriched players page by page: fetch -> parse -> enrich"""
+    for players_on_page in scrape_listing_pages(fetcher, base_url, num_pages, journal):
+        yield from enrich_with_profile_stats(fetcher, players_on_page, journal)
+
+FIELDNAMES = [
+    "ID", "Player", "Position", "Age", "Nationality", "Club", "MarketValue",
+    *STAT_KEYS, "ProfileURL"
+]
+
+def save_players(players, filename='players_data_full.csv'):
+    """Stream players into a CSV (or .parquet dataset) as they arrive"""
+    return write_rows(players, filename, FIELDNAMES, batch_size=25)
 
 # --- Main Execution ---
-base_url = "https://www.transfermarkt.com/spieler-statistik/wertvollstespieler/marktwertetop"
-num_pages_to_scrape = 20
-
-print("Starting scraping...")
-final_player_data = get_all_player_data(base_url, num_pages_to_scrape)
-print(f"\nDone. Total players scraped: {len(final_player_data)}")
-
-# Save to CSV
-if final_player_data:
-    keys = final_player_data[0].keys()
-    with open('players_data_full.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=keys)
-        writer.writeheader()
-        writer.writerows(final_player_data)
-    print("Data saved to players_data_full.csv")
-else:
-    print("No data scraped.")
-
+def main():
+    parser = argparse.ArgumentParser(description="Scrape most valuable players and their profile stats")
+    parser.add_argument("--pages", type=int, default=20, help="number of listing pages to scrape")
+    add_fetch_arguments(parser)
+    add_parser_argument(parser)
+    add_journal_arguments(parser, incremental=True)
+    add_history_arguments(parser)
+    parser.add_argument("--output", default="players_data_full.csv", help="CSV file or .parquet directory")
+    args = parser.parse_args()
+    set_parser(args.parser)
+
+    base_url = "https://www.transfermarkt.com/spieler-statistik/wertvollstespieler/marktwertetop"
+    fetcher = fetcher_from_args(headers, args)
+    journal = journal_from_args(args)
+
+    print("Starting scraping...")
+    count = save_players(get_all_player_data(fetcher, base_url, args.pages, journal), args.output)
+    fetcher.close()
+    journal.close()
+    print(f"\nDone. Total players scraped: {count}")
+
+    if count:
+        print(f"Data saved to {args.output}")
+        history_from_args(args, count)
+    else:
+        print("No data scraped.")
+
+if __name__ == "__main__":
+    main()
 
 
 
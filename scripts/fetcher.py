@@ -0,0 +1,235 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+class RateLimiter:
+    """Per-host token bucket: `rate` requests per second with bursts of up to `burst`"""
+
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # host -> (tokens, last refill time)
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        """Block until a request to the host of `url` is allowed"""
+        host = urlsplit(url).netloc
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                tokens, last = self.buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+                self.buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "http_cache")
+
+class ResponseCache:
+    """On-disk HTTP cache: bodies stored by content hash, an SQLite index keyed by URL+params
+
+    Entries keep the ETag/Last-Modified validators for conditional requests and the
+    least recently used ones are evicted once the stored bodies exceed `max_bytes`.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=24 * 3600, max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT,"
+            " fetched_at REAL, accessed_at REAL, body_hash TEXT, size INTEGER)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self.db.commit()
+
+    @staticmethod
+    def key_for(url, params=None):
+        """Cache key of the fully encoded request URL, so param order does not matter"""
+        prepared = requests.Request("GET", url, params=sorted((params or {}).items())).prepare()
+        return hashlib.sha256(prepared.url.encode("utf-8")).hexdigest(), prepared.url
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.directory, "bodies", body_hash)
+
+    def lookup(self, key):
+        """Return the cached entry for `key` as a dict, or None"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT etag, last_modified, fetched_at, body_hash FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or not os.path.exists(self._body_path(row[3])):
+                return None
+            self.db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+        etag, last_modified, fetched_at, body_hash = row
+        return {"etag": etag, "last_modified": last_modified, "fetched_at": fetched_at, "body_hash": body_hash}
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def read(self, entry):
+        with open(self._body_path(entry["body_hash"]), encoding="utf-8") as f:
+            return f.read()
+
+    def revalidated(self, key):
+        """Mark an entry as fresh again after a 304 Not Modified"""
+        with self.lock:
+            now = time.time()
+            self.db.execute("UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self.db.commit()
+
+    def store(self, key, url, text, etag=None, last_modified=None):
+        body = text.encode("utf-8")
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._body_path(body_hash)
+        with self.lock:
+            if not os.path.exists(path):
+                with open(path + ".tmp", "wb") as f:
+                    f.write(body)
+                os.replace(path + ".tmp", path)
+            now = time.time()
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, now, now, body_hash, len(body)),
+            )
+            self.db.commit()
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the distinct bodies fit in `max_bytes`"""
+        total = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM entries)"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self.db.execute("SELECT key, body_hash, size FROM entries ORDER BY accessed_at").fetchall()
+        for key, body_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            # Bodies are shared between URLs with identical content, only delete unreferenced ones
+            if not self.db.execute("SELECT 1 FROM entries WHERE body_hash = ?", (body_hash,)).fetchone():
+                os.remove(self._body_path(body_hash))
+                total -= size
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+class Fetcher:
+    """Shared keep-alive HTTP session with rate limiting, retries, caching and a worker pool
+
+    With `offline=True` pages are served only from the cache and nothing touches the network.
+    """
+
+    def __init__(self, headers, concurrency=4, rate=1.0, burst=None, retries=3, cache=None, offline=False):
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.limiter = RateLimiter(rate, burst or self.concurrency)
+        self.cache = cache
+        self.offline = offline
+
+        # One connection pool sized to the worker count so connections are reused
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, params=None):
+        """Fetch a page and return its HTML, or None after all retries fail"""
+        if self.cache is None:
+            return None if self.offline else self._download(url, params)
+
+        key, full_url = self.cache.key_for(url, params)
+        entry = self.cache.lookup(key)
+        if entry and (self.offline or self.cache.is_fresh(entry)):
+            return self.cache.read(entry)
+        if self.offline:
+            print(f"Not in cache (offline): {full_url}")
+            return None
+
+        # Stale or missing: ask the server, letting it answer 304 if our copy is still valid
+        conditional = {}
+        if entry and entry["etag"]:
+            conditional["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            conditional["If-Modified-Since"] = entry["last_modified"]
+
+        res = self._download(url, params, conditional, raw=True)
+        if res is None:
+            return None
+        if res.status_code == 304 and entry:
+            self.cache.revalidated(key)
+            return self.cache.read(entry)
+
+        self.cache.store(key, full_url, res.text, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+        return res.text
+
+    def _download(self, url, params=None, headers=None, raw=False):
+        for _ in range(self.retries):
+            self.limiter.acquire(url)
+            try:
+                res = self.session.get(url, params=params, headers=headers, timeout=30)
+                if res.status_code != 304:
+                    res.raise_for_status()
+                return res if raw else res.text
+            except Exception as e:
+                print(f"Error fetching {url}: {e}")
+        return None
+
+    def map(self, fn, items):
+        """Apply `fn` to every item on the worker pool, returning results in input order"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return list(pool.map(fn, items))
+
+    def imap(self, fn, items):
+        """Lazily apply `fn` on the worker pool, yielding results in input order
+
+        At most two results per worker are in flight, so memory does not grow with the input.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= 2 * self.concurrency:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+def add_fetch_arguments(parser):
+    """Register the network/cache options shared by the scraper CLIs"""
+    parser.add_argument("--concurrency", type=int, default=4, help="number of pages fetched in parallel")
+    parser.add_argument("--rate", type=float, default=1.0, help="max requests per second to the host")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="where fetched pages are cached")
+    parser.add_argument("--cache-ttl", type=float, default=24, help="hours before a cached page is revalidated")
+    parser.add_argument("--no-cache", action="store_true", help="always download, never cache")
+    parser.add_argument("--offline", action="store_true", help="replay pages from the cache only")
+
+def fetcher_from_args(headers, args):
+    """Build a Fetcher from the options registered by add_fetch_arguments"""
+    cache = None if args.no_cache else ResponseCache(args.cache_dir, ttl=args.cache_ttl * 3600)
+    return Fetcher(headers, concurrency=args.concurrency, rate=args.rate, cache=cache, offline=args.offline)
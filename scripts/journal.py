@@ -0,0 +1,74 @@
+import json
+import sqlite3
+import threading
+import time
+
+class ScrapeJournal:
+    """Append-only SQLite checkpoint of completed listing pages and profile lookups
+
+    A rerun with `resume` reuses every page already recorded, and profile stats are
+    reused as long as the player's market value is the same as when they were fetched.
+    """
+
+    def __init__(self, path, resume=False, keep_profiles=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (page INTEGER PRIMARY KEY, rows TEXT, done_at REAL)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " url TEXT PRIMARY KEY, market_value TEXT, stats TEXT, done_at REAL)"
+        )
+
+        # A new run starts from scratch unless told to pick up where the last one stopped
+        if not resume:
+            self.db.execute("DELETE FROM pages")
+            if not keep_profiles:
+                self.db.execute("DELETE FROM profiles")
+        self.db.commit()
+
+    def page_rows(self, page):
+        """Rows recorded for a listing page, or None if it has not been completed"""
+        with self.lock:
+            row = self.db.execute("SELECT rows FROM pages WHERE page = ?", (page,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record_page(self, page, rows):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", (page, json.dumps(rows), time.time())
+            )
+            self.db.commit()
+
+    def profile_stats(self, url, market_value):
+        """Stats recorded for a profile, or None if missing or the market value has changed since"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT stats FROM profiles WHERE url = ? AND market_value = ?", (url, market_value)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record_profile(self, url, market_value, stats):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)",
+                (url, market_value, json.dumps(stats), time.time()),
+            )
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+def add_journal_arguments(parser, incremental=False):
+    """Register the checkpoint options shared by the scraper CLIs"""
+    parser.add_argument("--journal", help="checkpoint file (default: <output>.journal.sqlite)")
+    parser.add_argument("--resume", action="store_true", help="continue the last interrupted run")
+    if incremental:
+        parser.add_argument(
+            "--incremental", action="store_true",
+            help="only re-fetch profiles of players whose market value changed since the last run",
+        )
+
+def journal_from_args(args):
+    path = args.journal or f"{args.output}.journal.sqlite"
+    return ScrapeJournal(path, resume=args.resume, keep_profiles=getattr(args, "incremental", False))
@@ -0,0 +1,27 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401  (only needed as a BeautifulSoup tree builder)
+    FAST_PARSER = "lxml"
+except ImportError:
+    FAST_PARSER = "html.parser"
+
+PARSERS = ["auto", "lxml", "html.parser"]
+
+# Only build the parts of a page the scrapers read, everything else is skipped while parsing
+PLAYERS_TABLE = SoupStrainer("table", class_="items")
+PROFILE_FACTS = SoupStrainer(class_="quick-facts")
+
+parser_backend = FAST_PARSER
+
+def set_parser(name):
+    """Select the BeautifulSoup tree builder ('auto' picks lxml when installed)"""
+    global parser_backend
+    parser_backend = FAST_PARSER if name == "auto" else name
+
+def make_soup(html, only=None):
+    """Parse `html` with the selected backend, restricted to the `only` strainer if given"""
+    return BeautifulSoup(html, parser_backend, parse_only=only)
+
+def add_parser_argument(parser):
+    parser.add_argument("--parser", choices=PARSERS, default="auto", help="HTML parser backend")
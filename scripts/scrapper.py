@@ -1,7 +1,14 @@
-import requests
-from bs4 import BeautifulSoup
-import csv
-import time
+import argparse
+import os
+import sys
+from fetcher import add_fetch_arguments, fetcher_from_args
+from journal import add_journal_arguments, journal_from_args
+from parsing import PLAYERS_TABLE, add_parser_argument, make_soup, set_parser
+from sinks import write_rows
+
+# The snapshot store is shared with the app, which lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from player_history import add_history_arguments, history_from_args
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
@@ -18,16 +25,9 @@ PARAMS = {
     "plus": "1"
 }
 
-def get_soup(url, params=None):
-    for _ in range(3):
-        try:
-            res = requests.get(url, headers=HEADERS, params=params)
-            res.raise_for_status()
-            return BeautifulSoup(res.text, "html.parser")
-        except Exception as e:
-            print(f"Error fetching {url}: {e}")
-            time.sleep(2)
-    return None
+def get_soup(fetcher, url, params=None):
+    html = fetcher.get(url, params=params)
+    return make_soup(html, only=PLAYERS_TABLE) if html is not None else None
 
 def parse_players_table(soup, starting_id):
     players = []
@@ -85,42 +85,72 @@ def parse_players_table(soup, starting_id):
 
     return players, starting_id
 
-def scrape_players(pages=1):
-    all_players = []
-    current_id = 1
-    for page in range(1, pages + 1):
+FIELDNAMES = [
+    "ID", "Player", "Position", "Age", "Nationality", "Club",
+    "MarketValue", "MatchesPlayed", "Goals", "OwnGoals",
+    "Assists", "YellowCards", "DoubleYellowCards", "RedCards"
+]
+
+def scrape_pages(fetcher, pages=1, journal=None):
+    """Yield (page, players) in page order while the fetcher works ahead on the next pages"""
+    def fetch_page(page):
+        if journal:
+            rows = journal.page_rows(page)
+            if rows is not None:
+                print(f"📄 Page {page} already scraped, reusing {len(rows)} players")
+                return rows
+
         print(f"📄 Scraping page {page}...")
         params = PARAMS.copy()
         params["page"] = page
-
-        soup = get_soup(BASE_URL, params)
+        soup = get_soup(fetcher, BASE_URL, params)
         if not soup:
+            return None
+
+        players_on_page, _ = parse_players_table(soup, 1)
+        print(f" Extracted {len(players_on_page)} players from page {page}")
+        if journal:
+            journal.record_page(page, players_on_page)
+        return players_on_page
+
+    page_numbers = range(1, pages + 1)
+    yield from zip(page_numbers, fetcher.imap(fetch_page, page_numbers))
+
+def scrape_players(fetcher, pages=1, journal=None):
+    """Yield players numbered in page order, so IDs stay deterministic"""
+    current_id = 1
+    for page, players_on_page in scrape_pages(fetcher, pages, journal):
+        if players_on_page is None:
             print(f"❌ Failed to retrieve page {page}")
             continue
+        for player in players_on_page:
+            player["ID"] = current_id
+            current_id += 1
+            yield player
 
-        players_on_page, current_id = parse_players_table(soup, current_id)
-        all_players.extend(players_on_page)
-
-        print(f" Extracted {len(players_on_page)} players from page {page}")
-        time.sleep(2)
-    return all_players
-
-def save_to_csv(players, filename="transfermarkt_players.csv"):
-    keys = [
-        "ID", "Player", "Position", "Age", "Nationality", "Club",
-        "MarketValue", "MatchesPlayed", "Goals", "OwnGoals",
-        "Assists", "YellowCards", "DoubleYellowCards", "RedCards"
-    ]
-    with open(filename, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=keys)
-        writer.writeheader()
-        writer.writerows(players)
-    print(f" Saved {len(players)} players to {filename}")
+def save_players(players, filename="transfermarkt_players.csv"):
+    """Stream players into a CSV (or .parquet dataset) as they arrive"""
+    count = write_rows(players, filename, FIELDNAMES, batch_size=25)
+    print(f" Saved {count} players to {filename}")
+    return count
 
 def main():
-    pages_to_scrape = 20  # You can change this as needed
-    players = scrape_players(pages=pages_to_scrape)
-    save_to_csv(players)
+    parser = argparse.ArgumentParser(description="Scrape Transfermarkt's most valuable players")
+    parser.add_argument("--pages", type=int, default=20, help="number of listing pages to scrape")
+    add_fetch_arguments(parser)
+    add_parser_argument(parser)
+    add_journal_arguments(parser)
+    add_history_arguments(parser)
+    parser.add_argument("--output", default="transfermarkt_players.csv", help="CSV file or .parquet directory")
+    args = parser.parse_args()
+    set_parser(args.parser)
+
+    fetcher = fetcher_from_args(HEADERS, args)
+    journal = journal_from_args(args)
+    count = save_players(scrape_players(fetcher, pages=args.pages, journal=journal), args.output)
+    fetcher.close()
+    journal.close()
+    history_from_args(args, count)
 
 if __name__ == "__main__":
     main()
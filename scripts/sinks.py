@@ -0,0 +1,84 @@
+import csv
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = pq = None
+
+class CsvSink:
+    """Append rows to a CSV file, flushing after every batch so readers see them right away"""
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction="ignore")
+        self.writer.writeheader()
+        self.file.flush()
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetSink:
+    """Write each batch as its own part file in a Parquet dataset directory
+
+    Parquet files are only readable once closed, so one file per batch is what
+    makes partial results visible to `pd.read_parquet(directory)` during a scrape.
+    """
+
+    def __init__(self, path, fieldnames):
+        if pq is None:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+        self.path = path
+        self.fieldnames = fieldnames
+        self.parts = 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.lstrip(".").startswith("part-") and name.endswith((".parquet", ".parquet.tmp")):
+                os.remove(os.path.join(path, name))
+
+    def write_batch(self, rows):
+        # Scraped values are text, keep every part on the same all-string schema
+        columns = {
+            name: pa.array([None if row.get(name) is None else str(row[name]) for row in rows], type=pa.string())
+            for name in self.fieldnames
+        }
+        name = f"part-{self.parts:05d}.parquet"
+        part = os.path.join(self.path, name)
+        # The dot prefix hides the part from dataset readers until it is complete
+        tmp_path = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(pa.table(columns), tmp_path)
+        os.replace(tmp_path, part)
+        self.parts += 1
+
+    def close(self):
+        pass
+
+def open_sink(path, fieldnames):
+    """CSV or Parquet sink, picked from the output file extension"""
+    if path.endswith(".parquet"):
+        return ParquetSink(path, fieldnames)
+    return CsvSink(path, fieldnames)
+
+def write_rows(rows, path, fieldnames, batch_size=100):
+    """Stream rows from an iterable into `path` in batches, returning how many were written"""
+    sink = open_sink(path, fieldnames)
+    batch, total = [], 0
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                sink.write_batch(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            sink.write_batch(batch)
+            total += len(batch)
+    finally:
+        sink.close()
+    return total
@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import contextlib
+import time
+import numpy as np
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from market_model import ML_FEATURES, MODEL_PATH, fit_baseline, known_groups, load_model, predict_values, score_players, validate_columns
+from player_data import DATA_PATH, dataset_fingerprint, fold_name, load_players
+from recommend import PlayerIndex, SimilarityIndex
+
+# Columns returned for every player in /recommend and /similar responses
+PLAYER_COLUMNS = ['PlayerKey', 'PlayerName', 'Age', 'Position', 'Club', 'MarketValue', 'PredictedValue', 'ValueGap']
+
+# ---------------------- Micro-Batching ----------------------
+
+class MicroBatcher:
+    """Merge concurrent /predict calls into one `model.predict` per batch
+
+    The first waiting request opens a batch; whatever else arrives within `max_wait`
+    seconds (up to `max_rows` rows) is scored with it, off the event loop.
+    """
+
+    def __init__(self, model, features, max_rows=1024, max_wait=0.002):
+        self.model = model
+        self.features = list(features)
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.batches = 0
+
+    async def predict(self, X, groups):
+        """Predicted values for the rows of the float matrix `X` and their position groups (-1 if unknown)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((X, groups, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            X = pd.DataFrame(np.vstack([X for X, _, _ in batch]), columns=self.features)
+            groups = np.concatenate([groups for _, groups, _ in batch])
+            try:
+                predicted = await asyncio.to_thread(predict_values, self.model, X, groups)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+
+            offsets = np.cumsum([len(X) for X, _, _ in batch])[:-1]
+            for (_, _, future), values in zip(batch, np.split(predicted, offsets)):
+                if not future.done():  # the client may have disconnected
+                    future.set_result(values)
+
+# ---------------------- Scoring State ----------------------
+
+class ScoringService:
+    """Players, model and search indexes, built once per worker process"""
+
+    def __init__(self, source=DATA_PATH, model_path=MODEL_PATH, features=ML_FEATURES):
+        started = time.perf_counter()
+        self.features = list(features)
+        self.fingerprint = dataset_fingerprint(source)
+        df = load_players(source)
+
+        loaded = load_model(self.fingerprint, self.features, model_path)
+        self.model, self.info = loaded if loaded else fit_baseline(df, self.features)
+        if loaded is None:
+            print("No trained model for this dataset, serving the linear baseline (run `python market_model.py train`)")
+
+        self.players = score_players(df, self.model, self.features)
+        self.player_index = PlayerIndex(self.players)
+        self.similarity_index = SimilarityIndex(self.players, self.features)
+        self.search_names = self.players['SearchName'].to_numpy()
+        keys = self.players['PlayerKey'].astype(str)
+        first = ~keys.duplicated().to_numpy()
+        self.key_rows = pd.Series(np.flatnonzero(first), index=keys[first])  # hash index: key -> first row
+        self.columns = {name: self.players[name].to_numpy() for name in PLAYER_COLUMNS}
+        self.batcher = None
+        print(f"Loaded {len(self.players)} players and the {self.info['model']} model in {time.perf_counter() - started:.2f}s")
+
+    def rows(self, positions):
+        """Player records for the given row positions, JSON-safe (NaN becomes null)"""
+        columns = [self.columns[name][positions].tolist() for name in PLAYER_COLUMNS]
+        return [
+            {name: None if value != value else value for name, value in zip(PLAYER_COLUMNS, values)}
+            for values in zip(*columns)
+        ]
+
+    def find_player(self, name=None, key=None):
+        """Row position of the player with PlayerKey `key`, or else the first whose name matches `name` (accents and case ignored)"""
+        if key is not None:
+            return int(self.key_rows[key]) if key in self.key_rows.index else None
+        matches = np.flatnonzero(self.search_names == fold_name(name or ""))
+        return int(matches[0]) if len(matches) else None
+
+# ---------------------- Endpoints ----------------------
+
+def error(message, status=400):
+    return JSONResponse({"error": message}, status_code=status)
+
+def flag(params, name):
+    return params.get(name, "").lower() in ("1", "true", "yes")
+
+def feature_matrix(records, features):
+    """Float matrix of the model features of each record, missing or null values as NaN
+
+    Numeric text such as "12" is accepted; any other value raises ValueError.
+    """
+    try:
+        X = np.array([[record.get(name) for name in features] for record in records], dtype=float)
+        if X.shape != (len(records), len(features)):  # every value a list nests one level deeper
+            raise ValueError
+    except (TypeError, ValueError):
+        # Text takes the slower per-value route
+        X = np.empty((len(records), len(features)))
+        for i, record in enumerate(records):
+            for j, name in enumerate(features):
+                value = record.get(name)
+                try:
+                    X[i, j] = np.nan if value is None else float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"{name} must be a number, got {value!r}") from None
+    if np.isinf(X).any():
+        raise ValueError("Feature values must be finite numbers")
+    return X
+
+async def predict(request):
+    """POST a player object or {"players": [...]} with the model features, get predicted values back
+
+    An optional "Position" per player selects the model of its position group.
+    """
+    service = request.app.state.service
+    try:
+        body = await request.json()
+    except ValueError:
+        return error("Request body must be JSON")
+    records = body.get("players", [body]) if isinstance(body, dict) else body
+    if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+        return error('Send a player object or {"players": [...]}')
+
+    try:
+        validate_columns(set().union(*records), service.features)
+        X = feature_matrix(records, service.features)
+    except ValueError as e:
+        return error(str(e))
+    X = np.nan_to_num(X, nan=0.0)
+    groups = known_groups([record.get("Position") for record in records])
+
+    predicted = await service.batcher.predict(X, groups)
+    return JSONResponse({"model": service.info["model"], "predictions": predicted.tolist()})
+
+async def recommend(request):
+    """Players within `budget`, optionally filtered by `position`, `exclude_club` and `undervalued`"""
+    service = request.app.state.service
+    params = request.query_params
+    try:
+        budget = float(params.get("budget", 50_000_000))
+        limit = int(params.get("limit", 20))
+    except ValueError:
+        return error("budget and limit must be numbers")
+    if not np.isfinite(budget):
+        return error("budget must be a finite number")
+    undervalued = flag(params, "undervalued")
+
+    rows = service.player_index.filter(
+        budget,
+        positions=params.getlist("position") or None,
+        excluded_clubs=params.getlist("exclude_club") or None,
+        undervalued=undervalued,
+        order="ValueGap" if undervalued else "MarketValue",
+    )
+    return JSONResponse({"total": int(len(rows)), "players": service.rows(rows[:max(limit, 0)])})
+
+async def similar(request):
+    """Players closest to `key` (a PlayerKey) or `player` (a name) on standardized stats and position"""
+    service = request.app.state.service
+    params = request.query_params
+    row = service.find_player(params.get("player"), params.get("key"))
+    if row is None:
+        return error(f"Unknown player: {params.get('key') or params.get('player', '')!r}", status=404)
+    try:
+        k = int(params.get("k", 10))
+        budget = float(params["budget"]) if "budget" in params else None
+    except ValueError:
+        return error("k and budget must be numbers")
+    if budget is not None and not np.isfinite(budget):
+        return error("budget must be a finite number")
+
+    mask = None
+    if flag(params, "undervalued") or budget is not None:
+        mask = np.ones(len(service.players), dtype=bool)
+        if flag(params, "undervalued"):
+            mask &= service.players['ValueGap'].to_numpy() > 0
+        if budget is not None:
+            mask &= service.players['MarketValue'].to_numpy() <= budget
+
+    rows, distances = service.similarity_index.similar(row, k=max(k, 0), mask=mask)
+    players = service.rows(rows)
+    for player, distance in zip(players, distances.tolist()):
+        player["Distance"] = distance
+    return JSONResponse({"player": service.rows([row])[0], "similar": players})
+
+async def health(request):
+    service = request.app.state.service
+    return JSONResponse({
+        "players": len(service.players),
+        "model": service.info["model"],
+        "version": service.info.get("version"),
+        "fingerprint": service.fingerprint,
+        "batches": service.batcher.batches,
+    })
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Every worker process loads its own copy once, before it accepts requests
+    service = await asyncio.to_thread(ScoringService)
+    service.batcher = MicroBatcher(service.model, service.features)
+    worker = asyncio.create_task(service.batcher.run())
+    app.state.service = service
+    yield
+    worker.cancel()
+
+app = Starlette(
+    routes=[
+        Route("/predict", predict, methods=["POST"]),
+        Route("/recommend", recommend),
+        Route("/similar", similar),
+        Route("/health", health),
+    ],
+    lifespan=lifespan,
+)
+
+# ---------------------- CLI ----------------------
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve market value predictions and recommendations over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, each loads the model once")
+    args = parser.parse_args()
+    uvicorn.run("service:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+
+if __name__ == "__main__":
+    main()